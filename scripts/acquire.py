@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scripts.download import (ids, download_file, download_from_vic_datashare, fetch_data_from_api,
+                              make_session, remote_version)
+
+MANIFEST_FILE = 'data/sources.json'
+CACHE_DIR = 'data/landing/.cache'
+N_WORKERS = 6
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    """
+    Loads the list of data sources.
+
+    Each source has a `name`, a `kind` ("file", "vicmap" or "abs_api"), a `target` path relative
+    to the repository root and a `refresh_days` policy: the number of days before the source is
+    checked for a newer version, or null to only fetch it when it is missing. "file" and
+    "vicmap" sources have a `url` and an optional expected `sha256`. Only "file" sources are kept
+    in the content-addressed `SourceCache`: a Vicmap order is extracted in place and checked
+    against its own `.manifest.json`, and ABS data is assembled from many API calls, so there is
+    no single file to store. The cache only remembers when those two were last fetched.
+    """
+    with open(manifest_file) as f:
+        return json.load(f)['sources']
+
+
+class SourceCache:
+    """
+    Content-addressed store of downloaded files under `data/landing/.cache`.
+
+    Each file is kept once at `objects/<sha256[:2]>/<sha256>` and hard linked (or copied) to
+    the paths that use it, so a target that goes missing is restored without the network and
+    a source pinned to a hash that is already stored is never downloaded. `state.json`
+    remembers the hash, version and fetch time of every source. Only "file" sources are
+    stored, "vicmap" and "abs_api" ones just have their fetch time recorded.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'downloads'), exist_ok=True)
+        self.state_file = os.path.join(directory, 'state.json')
+        self.state = {}
+        if os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                self.state = json.load(f)
+        self.lock = threading.Lock()
+
+    def blob_path(self, sha256):
+        return os.path.join(self.directory, 'objects', sha256[:2], sha256)
+
+    def has(self, sha256):
+        return bool(sha256) and os.path.exists(self.blob_path(sha256))
+
+    def add(self, path, sha256):
+        """Moves a downloaded file into the store."""
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.replace(path, blob)
+
+    def links_to(self, sha256, target):
+        return os.path.exists(target) and os.path.getsize(target) == os.path.getsize(self.blob_path(sha256))
+
+    def link(self, sha256, target):
+        """Puts a stored file at `target`."""
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(self.blob_path(sha256), target)
+        except OSError:
+            # e.g. the target is on another file system
+            shutil.copyfile(self.blob_path(sha256), target)
+
+    def record(self, name, **entry):
+        with self.lock:
+            self.state[name] = entry
+            with open(f"{self.state_file}.tmp", 'w') as f:
+                json.dump(self.state, f, indent=4)
+            os.replace(f"{self.state_file}.tmp", self.state_file)
+
+
+def is_stale(source, entry, force=False):
+    if force or entry is None:
+        return True
+    if source.get('refresh_days') is None:
+        return False
+    return time.time() - entry['fetched_at'] > source['refresh_days'] * 86400
+
+
+def fetch_file(source, target, cache, force=False):
+    """
+    Makes sure a file source is at `target`, downloading it only when it is missing from the
+    cache or stale and has changed on the server.
+
+    Returns:
+    str: what had to be done, e.g. 'fresh' or 'downloaded'.
+    """
+    name, url, sha256 = source['name'], source['url'], source.get('sha256')
+    entry = cache.state.get(name)
+
+    # a pinned hash that is already stored never needs the network
+    if cache.has(sha256):
+        if not cache.links_to(sha256, target):
+            cache.link(sha256, target)
+            return 'restored'
+        return 'fresh'
+
+    known = entry is not None and entry['url'] == url and cache.has(entry['sha256'])
+    if known and not is_stale(source, entry, force):
+        if not cache.links_to(entry['sha256'], target):
+            cache.link(entry['sha256'], target)
+            return 'restored'
+        return 'fresh'
+
+    download = os.path.join(cache.directory, 'downloads', name)
+    with make_session(1) as session:
+        remote = remote_version(session, url)
+        if known and not sha256 and remote and any(remote.values()) and all(
+                remote[key] == entry.get(key) for key in ('etag', 'last_modified', 'size')):
+            cache.record(name, **{**entry, 'fetched_at': time.time()})
+            if not cache.links_to(entry['sha256'], target):
+                cache.link(entry['sha256'], target)
+            return 'revalidated'
+        digest = download_file(url, download, sha256, session)
+    cache.add(download, digest)
+    cache.link(digest, target)
+    cache.record(name, url=url, sha256=digest, fetched_at=time.time(), **(remote or {}))
+    return 'downloaded'
+
+
+def fetch_vicmap(source, target, cache, force=False):
+    """Keeps a Vicmap shapefile order extracted at `target`, see `download_from_vic_datashare`."""
+    entry = cache.state.get(source['name'])
+    if os.path.exists(os.path.join(target, '.manifest.json')) and not is_stale(source, entry, force):
+        return 'fresh'
+    download_from_vic_datashare(source['url'], target, source['dataset'], source.get('sha256'),
+                                source.get('layers'), source.get('in_place', False))
+    cache.record(source['name'], url=source['url'], fetched_at=time.time())
+    return 'checked'
+
+
+def fetch_abs_api(source, target, cache, force=False, root='.'):
+    """Fetches ABS regional data for every SA2 id in `scripts.download.ids`, see `fetch_data_from_api`."""
+    entry = cache.state.get(source['name'])
+    if os.path.exists(target) and not is_stale(source, entry, force):
+        return 'fresh'
+    table = os.path.join(root, source['table']) if source.get('table') else None
+    failed = fetch_data_from_api(ids, source['start_period'], source['dimension_at_observation'], target, table)
+    if failed:
+        raise RuntimeError(f"{len(failed)} ids could not be fetched")
+    cache.record(source['name'], fetched_at=time.time())
+    return 'downloaded'
+
+
+def acquire(names=None, root='.', manifest_file=None, workers=N_WORKERS, force=False):
+    """
+    Fetches the data sources of the manifest that are missing or stale, several at a time.
+
+    Parameters:
+    names: optional names of the sources to fetch, defaults to all of them.
+    root: the repository root, e.g. '..' from the notebooks directory.
+    manifest_file: path of the manifest, defaults to `data/sources.json` under `root`.
+    workers: number of sources fetched at the same time.
+    force: check every source for a newer version, whatever its refresh policy.
+
+    Returns:
+    dict: what was done for each source, or the error that stopped it.
+    """
+    sources = load_manifest(manifest_file or os.path.join(root, MANIFEST_FILE))
+    if names:
+        sources = [source for source in sources if source['name'] in names]
+    cache = SourceCache(os.path.join(root, CACHE_DIR))
+
+    def fetch(source):
+        target = os.path.join(root, source['target'])
+        if source['kind'] == 'file':
+            return fetch_file(source, target, cache, force)
+        if source['kind'] == 'vicmap':
+            return fetch_vicmap(source, target, cache, force)
+        if source['kind'] == 'abs_api':
+            return fetch_abs_api(source, target, cache, force, root)
+        raise ValueError(f"Unknown kind of source: {source['kind']}")
+
+    start = time.perf_counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch, source): source['name'] for source in sources}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as err:
+                results[name] = f"failed: {err}"
+            print(f"{name}: {results[name]}")
+    print(f"Acquired {len(sources)} sources in {time.perf_counter() - start:.1f}s.")
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=f"Fetch the data sources listed in {MANIFEST_FILE}")
+    arg_parser.add_argument('names', nargs='*', help="only fetch these sources")
+    arg_parser.add_argument('--workers', type=int, default=N_WORKERS)
+    arg_parser.add_argument('--force', action='store_true',
+                            help="check every source for a newer version, whatever its refresh policy")
+    args = arg_parser.parse_args()
+    acquire(args.names, workers=args.workers, force=args.force)
@@ -0,0 +1,247 @@
+import io
+import os
+import gzip
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import contextlib
+import multiprocessing
+from urllib.parse import urlparse
+from aiohttp import web
+from scripts.scrape import (BASE_URL, CACHE_DIR, N_PAGES, N_WORKERS, PER_HOST_LIMIT, RESULTS_PER_PAGE,
+                            AdaptiveRateLimiter, fetch_property_links_async, get_unique_urls,
+                            scrape_property_data_async)
+
+
+def load_recorded_pages(cache_dir):
+    """
+    Loads every page saved in the scraper's HTTP cache.
+
+    Parameters:
+    cache_dir: directory of an HTTPCache.
+
+    Returns:
+    dict: the HTML of each page keyed by its path and query string, e.g. '/rent/footscray-vic-3011/?page=1'.
+    """
+    pages = {}
+    if not os.path.isdir(cache_dir):
+        return pages
+    for file_name in sorted(os.listdir(cache_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        with open(os.path.join(cache_dir, file_name), encoding='utf-8') as f:
+            url = urlparse(json.load(f)['url'])
+        with gzip.open(os.path.join(cache_dir, file_name[:-len('.json')] + '.html.gz'), 'rt', encoding='utf-8') as f:
+            pages[url.path + (f"?{url.query}" if url.query else '')] = f.read()
+    return pages
+
+
+def synthetic_pages(n_suburbs=20, max_listings=60, seed=0):
+    """
+    Makes a small site in the shape of domain.com.au for when no crawl has been recorded yet.
+
+    Parameters:
+    n_suburbs: number of suburbs with search results.
+    max_listings: the most listings a suburb can have.
+    seed: seed of the listing counts, so every run serves the same site.
+
+    Returns:
+    dict: the HTML of each page keyed by its path and query string.
+    """
+    rng = random.Random(seed)
+    pages = {}
+    for s in range(n_suburbs):
+        slug = f"suburb-{s}-vic-{3000 + s}"
+        n = rng.randint(0, max_listings)
+        for page in range(1, -(-n // RESULTS_PER_PAGE) + 1):
+            cards = ''.join(
+                f'<li><a class="address is-two-lines" href="{BASE_URL}/{i}-smith-st-{slug}-{2017000000 + s * 1000 + i}">'
+                f'{i} Smith St</a><span>${rng.randint(300, 900)} per week</span></li>'
+                for i in range((page - 1) * RESULTS_PER_PAGE, min(page * RESULTS_PER_PAGE, n))
+            )
+            pages[f"/rent/{slug}/?page={page}"] = (
+                f'<html><body><h1 data-testid="summary"><strong>{n} Properties</strong> for rent in {slug}</h1>'
+                f'<ul data-testid="results">{cards}</ul></body></html>')
+        for i in range(n):
+            address = f"{i} Smith St, Suburb {s} VIC {3000 + s}"
+            state = {"props": {"pageProps": {"componentProps": {
+                "listingId": 2017000000 + s * 1000 + i, "headline": "Light filled apartment", "address": address,
+                "listingSummary": {"title": f"${rng.randint(300, 900)} per week", "beds": rng.randint(1, 4),
+                                   "baths": rng.randint(1, 2), "parking": rng.randint(0, 2),
+                                   "propertyType": "Apartment / Unit / Flat"},
+                "description": ["Close to shops and transport."] * 20,
+                "map": {"latitude": -37.8, "longitude": 144.9}}}}}
+            pages[f"/{i}-smith-st-{slug}-{2017000000 + s * 1000 + i}"] = (
+                f'<html><body><h1 class="css-164r41r">{address}</h1>'
+                f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state)}</script></body></html>')
+    return pages
+
+
+def serve(sock, pages, latency, jitter, error_rate, throttle_rate, seed, served=None):
+    """
+    Serves recorded pages from a listening socket until the process is terminated.
+
+    Each response is delayed by `latency` plus up to `jitter` seconds. A share `throttle_rate`
+    of requests is answered with a 429 asking to retry after a second, and a share `error_rate`
+    with a 500. Links to domain.com.au are rewritten to point back at the server. Every page
+    answered with a 200 is counted in `served`, an optional shared multiprocessing.Value.
+    """
+    host, port = sock.getsockname()[:2]
+    base_url = f"http://{host}:{port}"
+    pages = {path: html.replace(BASE_URL, base_url) for path, html in pages.items()}
+    rng = random.Random(seed)
+
+    async def handle(request):
+        await asyncio.sleep(latency + rng.random() * jitter)
+        draw = rng.random()
+        if draw < throttle_rate:
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        if draw < throttle_rate + error_rate:
+            return web.Response(status=500)
+        html = pages.get(request.path_qs)
+        if html is None:
+            return web.Response(status=404)
+        if served is not None:
+            with served.get_lock():
+                served.value += 1
+        return web.Response(text=html, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handle)
+    web.run_app(app, sock=sock, print=None, handle_signals=True)
+
+
+def peak_memory_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if peak > 1024 ** 3 else peak / 1024
+
+
+def measure(stage, func, pages, verbose=False, timeout=None, served=None):
+    """
+    Runs one stage of the crawl and reports its throughput.
+
+    Parameters:
+    stage: name of the stage in the report.
+    func: function returning the coroutine that runs the stage.
+    pages: function taking the stage's output and returning how many pages it fetched.
+    verbose: keep the crawler's per-page logging.
+    timeout: seconds after which the stage is cancelled, None waits for it to finish.
+    served: the mock server's count of pages served, used for the throughput of a stage
+    that timed out.
+
+    Returns:
+    tuple: (output of func, or None if the stage timed out, dict with the stage's pages,
+    seconds, pages/s, CPU ms per page, peak memory and whether it timed out).
+    """
+    served_before = served.value if served is not None else 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    with contextlib.ExitStack() as quiet:
+        if not verbose:
+            quiet.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            quiet.enter_context(contextlib.redirect_stderr(io.StringIO()))
+        try:
+            output = asyncio.run(asyncio.wait_for(func(), timeout))
+        except asyncio.TimeoutError:
+            output = None
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    n = pages(output) if output is not None else served.value - served_before if served is not None else 0
+    result = {'stage': stage, 'pages': n, 'seconds': round(wall, 3), 'pages_per_second': round(n / wall, 1),
+              'cpu_ms_per_page': round(1000 * cpu / max(n, 1), 2), 'peak_memory_mb': round(peak_memory_mb(), 1),
+              'timed_out': output is None}
+    print(f"{stage:>9}: {n:6d} pages in {wall:7.2f}s, {result['pages_per_second']:8.1f} pages/s, "
+          f"{result['cpu_ms_per_page']:6.2f} ms CPU per page, peak memory {result['peak_memory_mb']:.0f} MB"
+          + (" (timed out, pages served so far)" if output is None else ""))
+    return output, result
+
+
+def benchmark_crawl(pages, workers=N_WORKERS, per_host=PER_HOST_LIMIT, rate=1000, latency=0.05, jitter=0.05,
+                    error_rate=0.0, throttle_rate=0.0, seed=0, verbose=False, timeout=None):
+    """
+    Crawls a local mock server replaying `pages` end to end and reports the throughput of the
+    index and listing stages. The server runs in its own process so only the crawler's CPU
+    time is counted.
+
+    Parameters:
+    pages: the HTML of each page keyed by its path and query string.
+    workers: number of pages fetched at the same time.
+    per_host: maximum number of open connections to the server.
+    rate: starting request rate, the crawl's usual adaptive limiter can't go above it.
+    latency: seconds the server waits before answering.
+    jitter: up to this many extra seconds of random delay per response.
+    error_rate: share of requests answered with a 500.
+    throttle_rate: share of requests answered with a 429.
+    seed: seed of the server's random delays and errors.
+    verbose: keep the crawler's per-page logging.
+    timeout: seconds each stage may run before it is cancelled and its partial throughput
+    reported, None waits for it to finish.
+
+    Returns:
+    list: a dict of results for each stage that ran.
+    """
+    suburbs = sorted({path.split('/')[2] for path in pages if path.startswith('/rent/')})
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(1024)
+    served = multiprocessing.Value('i', 0)
+    server = multiprocessing.Process(target=serve, daemon=True,
+                                     args=(sock, pages, latency, jitter, error_rate, throttle_rate, seed, served))
+    server.start()
+    base_url = "http://{}:{}".format(*sock.getsockname()[:2])
+    print(f"Mock server at {base_url} with {len(pages)} pages in {len(suburbs)} suburbs, "
+          f"{latency * 1000:.0f}+{jitter * 1000:.0f} ms latency, {error_rate:.0%} errors, {throttle_rate:.0%} 429s")
+    try:
+        limiter = AdaptiveRateLimiter(rate, max_rate=rate)
+        links, index = measure('index', lambda: fetch_property_links_async(
+            N_PAGES, suburbs, workers, per_host, rate, limiter=limiter, base_url=base_url),
+            lambda links: sum(path.startswith('/rent/') for path in pages), verbose, timeout, served)
+        if links is None:
+            print(f"Request rates at the timeout: {limiter.rates()}. Skipping the listings stage.")
+            return [index]
+        links = get_unique_urls(links)
+        records, listings = measure('listings', lambda: scrape_property_data_async(
+            links, workers, per_host, rate, limiter=limiter), len, verbose, timeout, served)
+    finally:
+        server.terminate()
+        server.join()
+        sock.close()
+    if records is None:
+        print(f"Found {len(links)} listings, scraped {listings['pages']} before the timeout, "
+              f"request rates then: {limiter.rates()}.")
+    else:
+        print(f"Found {len(links)} listings, scraped {len(records)}.")
+    return [index, listings]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the crawler in scripts/scrape.py against a local mock server")
+    arg_parser.add_argument('--corpus', default=CACHE_DIR,
+                            help="HTTP cache directory holding recorded pages, a synthetic site is used if it is empty")
+    arg_parser.add_argument('--workers', type=int, default=N_WORKERS)
+    arg_parser.add_argument('--per-host', type=int, default=PER_HOST_LIMIT)
+    arg_parser.add_argument('--rate', type=float, default=1000, help="maximum requests per second")
+    arg_parser.add_argument('--latency', type=float, default=0.05, help="server latency in seconds")
+    arg_parser.add_argument('--jitter', type=float, default=0.05, help="extra random latency in seconds")
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with a 500")
+    arg_parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of requests answered with a 429")
+    arg_parser.add_argument('--suburbs', type=int, default=20, help="number of suburbs on the synthetic site")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--output', default=None, help="also write the results to this JSON file")
+    arg_parser.add_argument('--verbose', action='store_true', help="keep the crawler's logging")
+    arg_parser.add_argument('--timeout', type=float, default=300,
+                            help="seconds each stage may run before its partial throughput is reported, 0 for no limit")
+    args = arg_parser.parse_args()
+
+    pages = load_recorded_pages(args.corpus)
+    if not any(path.startswith('/rent/') for path in pages):
+        print(f"No recorded index pages in {args.corpus}, serving a synthetic site.")
+        pages = synthetic_pages(args.suburbs, seed=args.seed)
+    results = benchmark_crawl(pages, args.workers, args.per_host, args.rate, args.latency, args.jitter,
+                              args.error_rate, args.throttle_rate, args.seed, args.verbose, args.timeout or None)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
@@ -0,0 +1,248 @@
+import time
+import random
+import argparse
+import pandas as pd
+from scripts.preprocess import (suburb_postcode_mapping, extract_suburb_postcode, extract_suburb_postcodes,
+                                categorise_property, categorise_properties, calculate_annual_increase,
+                                calculate_annual_increases, extract_number, extract_first_number,
+                                extract_listing_numbers)
+
+PROPERTY_TYPES = ['House', 'Apartment / Unit / Flat', 'Townhouse', 'New House and Land', None]
+MONTHS = ['January', 'Feb', 'March', 'Apr', 'May', 'June', 'Jul', 'August', 'Sept', 'October', 'Nov', 'December']
+RENTS = ['${:,} per week', '${:,} - ${:,} per week', '${:,}pw', '${:,} pcm', '${:,} per month', 'From ${:,}',
+         '${:,} - 12 month lease', '${:,} Fully Furnished - 6 month lease', 'Contact agent']
+STREETS = ['Smith St', 'High St', 'Albion St', 'Station Rd', 'Footscray Rd', 'Ballarat Rd', 'Main Rd', 'Park Cres']
+
+
+def extract_suburb_postcode_scan(address):
+    '''The original extract_suburb_postcode, which returns the first suburb of the mapping that
+    is a substring of the address, kept as the baseline'''
+    address_lower = address.lower()
+    for suburb, postcode in suburb_postcode_mapping.items():
+        if suburb in address_lower:
+            return suburb.title(), postcode
+    return 'Unknown', 'Unknown'
+
+
+def synthetic_addresses(n, seed=0):
+    '''
+    Makes addresses in the formats of the scraped listings.
+
+    Parameters:
+    n: number of addresses
+    seed: seed of the random choices
+
+    Returns:
+    series of addresses, mostly "3/12 Smith St, Seddon West VIC 3011" with some missing the
+    state and postcode and some in suburbs outside the mapping
+    '''
+    rng = random.Random(seed)
+    suburbs = list(suburb_postcode_mapping.items())
+    addresses = []
+    for _ in range(n):
+        suburb, postcode = rng.choice(suburbs)
+        number = rng.choice([f"{rng.randint(1, 200)}", f"{rng.randint(1, 20)}/{rng.randint(1, 200)}",
+                             f"{rng.randint(1, 200)}A", f"Unit {rng.randint(1, 20)}"])
+        street = rng.choice(STREETS)
+        kind = rng.random()
+        if kind < 0.9:
+            addresses.append(f"{number} {street}, {suburb.title()} VIC {postcode}")
+        elif kind < 0.97:
+            addresses.append(f"{number} {street} {suburb.title()}")
+        else:
+            addresses.append(f"{number} {street}, Nowhere VIC 3999")
+    return pd.Series(addresses)
+
+
+def time_it(func, repeat=1):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_suburb_extraction(n, baseline_rows=20000, repeat=1, seed=0):
+    '''
+    Compares the original row by row suburb extraction with the vectorized one.
+
+    The baseline only runs on the first `baseline_rows` addresses, its time for all `n` is
+    extrapolated from them.
+
+    Parameters:
+    n: number of addresses
+    baseline_rows: number of addresses the baseline runs on
+    repeat: number of runs of each version, the fastest one is reported
+    seed: seed of the synthetic addresses
+    '''
+    addresses = synthetic_addresses(n, seed)
+    sample = addresses.iloc[:baseline_rows]
+    print(f"Extracting suburbs and postcodes from {n} addresses")
+
+    scan_time, scan = time_it(lambda: sample.apply(lambda x: pd.Series(extract_suburb_postcode_scan(x))), repeat)
+    print(f"{'scan':>11}: {scan_time * n / len(sample):8.2f}s ({len(sample)} rows in {scan_time:.2f}s, extrapolated)")
+
+    trie_time, trie = time_it(lambda: sample.apply(lambda x: pd.Series(extract_suburb_postcode(x))), repeat)
+    print(f"{'row trie':>11}: {trie_time * n / len(sample):8.2f}s ({len(sample)} rows in {trie_time:.2f}s, extrapolated)")
+
+    vector_time, vector = time_it(lambda: extract_suburb_postcodes(addresses), repeat)
+    print(f"{'vectorized':>11}: {vector_time:8.2f}s ({n / vector_time:,.0f} rows/s, "
+          f"{scan_time * n / len(sample) / vector_time:.0f}x faster than the scan)")
+
+    # the scan picks the first substring in the mapping, so it differs where a longer name exists
+    head = vector.iloc[:len(sample)]
+    differ = (scan[0] != head['Suburb']) | (scan[1] != head['Postcode'])
+    trie_differ = (trie[0] != head['Suburb']) | (trie[1] != head['Postcode'])
+    print(f"The vectorized suburbs differ from the scan's on {differ.sum()} of {len(sample)} rows "
+          f"and from the row by row trie's on {trie_differ.sum()}, e.g.")
+    examples = pd.DataFrame({'Address': sample, 'scan': scan[0], 'vectorized': head['Suburb']})[differ]
+    print(examples.head(5).to_string(index=False))
+
+
+def synthetic_listings(n, seed=0):
+    '''Makes a dataframe of listings with synthetic addresses and property types'''
+    rng = random.Random(seed)
+    return pd.DataFrame({'Address': synthetic_addresses(n, seed),
+                         'Property Type': [rng.choice(PROPERTY_TYPES) for _ in range(n)]})
+
+
+def benchmark_categorisation(n, baseline_rows=20000, repeat=1, seed=0):
+    '''
+    Compares categorise_property applied row by row with categorise_properties.
+
+    Parameters:
+    n: number of listings
+    baseline_rows: number of listings the row by row version runs on
+    repeat: number of runs of each version, the fastest one is reported
+    seed: seed of the synthetic listings
+    '''
+    listings = synthetic_listings(n, seed)
+    sample = listings.iloc[:baseline_rows]
+    print(f"Categorising {n} listings")
+
+    row_time, rows = time_it(lambda: sample.apply(categorise_property, axis=1), repeat)
+    print(f"{'row by row':>11}: {row_time * n / len(sample):8.2f}s ({len(sample)} rows in {row_time:.2f}s, extrapolated)")
+
+    vector_time, vector = time_it(lambda: categorise_properties(listings), repeat)
+    print(f"{'vectorized':>11}: {vector_time:8.2f}s ({n / vector_time:,.0f} rows/s, "
+          f"{row_time * n / len(sample) / vector_time:.0f}x faster)")
+    print(f"Labels differ on {(rows != vector.iloc[:len(sample)]).sum()} of {len(sample)} rows.")
+
+
+def synthetic_historical_prices(n, seed=0):
+    '''Makes historical prices like "August 2023$1,100 - $1,200 June 2021$950", newest first,
+    with some listings missing them'''
+    rng = random.Random(seed)
+    histories = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            histories.append(None)
+            continue
+        month, price, pairs = rng.randint(2015 * 12, 2024 * 12), rng.randint(300, 1500), []
+        for _ in range(rng.randint(1, 5)):
+            low = f"${price:,}"
+            pairs.append(f"{MONTHS[month % 12]} {month // 12}{low}" + (f" - ${price + 50:,}" if rng.random() < 0.2 else ''))
+            month -= rng.randint(1, 30)
+            price = max(100, price - rng.randint(0, 100))
+        histories.append(' '.join(pairs))
+    return pd.DataFrame({'Historical Prices': histories})
+
+
+def benchmark_annual_increase(n, baseline_rows=20000, repeat=1, seed=0):
+    '''
+    Compares calculate_annual_increase applied row by row with calculate_annual_increases.
+
+    Parameters:
+    n: number of listings
+    baseline_rows: number of listings the row by row version runs on
+    repeat: number of runs of each version, the fastest one is reported
+    seed: seed of the synthetic historical prices
+    '''
+    listings = synthetic_historical_prices(n, seed)
+    sample = listings.iloc[:baseline_rows]
+    print(f"Calculating the annual increase of {n} listings")
+
+    row_time, rows = time_it(lambda: sample.apply(calculate_annual_increase, axis=1), repeat)
+    print(f"{'row by row':>11}: {row_time * n / len(sample):8.2f}s ({len(sample)} rows in {row_time:.2f}s, extrapolated)")
+
+    vector_time, vector = time_it(lambda: calculate_annual_increases(listings['Historical Prices']), repeat)
+    print(f"{'vectorized':>11}: {vector_time:8.2f}s ({n / vector_time:,.0f} rows/s, "
+          f"{row_time * n / len(sample) / vector_time:.0f}x faster)")
+
+    # the row by row dates fall on today's day of the month, so only prices, months and increases are compared
+    head = vector.iloc[:len(sample)]
+    differ = pd.Series(False, index=head.index)
+    for row_column, column in [(0, 'Oldest Price'), (2, 'Newest Price'), (4, 'Months'), (5, 'Annual Increase')]:
+        expected = pd.to_numeric(rows[row_column], errors='coerce')
+        actual = head[column].astype(float)
+        differ |= ~(((expected - actual).abs() < 1e-9) | (expected.isna() & actual.isna()))
+    print(f"Results differ on {differ.sum()} of {len(sample)} rows.")
+
+
+def synthetic_summaries(n, seed=0):
+    '''Makes the Beds, Baths, Cars and Cost columns of scraped listings, eg '2 Beds' and
+    '$550 - $600 per week', with some missing'''
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        rent = rng.randint(300, 1500)
+        cost = rng.choice(RENTS)
+        cost = cost.format(rent * 52 // 12) if 'pcm' in cost or 'per month' in cost else cost.format(rent, rent + 50)
+        rows.append({'Beds': f"{rng.randint(1, 5)} Beds", 'Baths': f"{rng.randint(1, 3)} Baths",
+                     'Cars': rng.choice([f"{rng.randint(1, 3)} Parking", '−', None]), 'Cost': cost})
+    return pd.DataFrame(rows)
+
+
+def benchmark_numbers(n, baseline_rows=20000, repeat=1, seed=0):
+    '''
+    Compares extract_number and extract_first_number applied cell by cell with
+    extract_listing_numbers.
+
+    Parameters:
+    n: number of listings
+    baseline_rows: number of listings the cell by cell version runs on
+    repeat: number of runs of each version, the fastest one is reported
+    seed: seed of the synthetic listings
+    '''
+    listings = synthetic_summaries(n, seed)
+    sample = listings.iloc[:baseline_rows]
+    print(f"Extracting the numbers of {n} listings")
+
+    def cell_by_cell():
+        return pd.DataFrame({**{column: sample[column].apply(extract_number) for column in ['Beds', 'Baths', 'Cars']},
+                             'Cost': sample['Cost'].apply(extract_first_number)})
+
+    cell_time, cells = time_it(cell_by_cell, repeat)
+    print(f"{'cell by cell':>12}: {cell_time * n / len(sample):8.2f}s ({len(sample)} rows in {cell_time:.2f}s, extrapolated)")
+
+    vector_time, vector = time_it(lambda: extract_listing_numbers(listings), repeat)
+    print(f"{'vectorized':>12}: {vector_time:8.2f}s ({1000 * vector_time / 4:.0f} ms per column, "
+          f"{cell_time * n / len(sample) / vector_time:.0f}x faster)")
+
+    # monthly rents are now weekly, so the costs are only compared where the rent is quoted weekly,
+    # which includes lease terms such as '$480 - 12 month lease'
+    head = vector.iloc[:len(sample)]
+    for column in ['Beds', 'Baths', 'Cars', 'Cost']:
+        old, new = cells[column].astype('Float64'), head[column].astype('Float64')
+        compared = ~sample[column].str.contains('per month|pcm', na=False) if column == 'Cost' else slice(None)
+        print(f"{column:>5} differs on {(old[compared] != new[compared]).fillna(old[compared].isna() != new[compared].isna()).sum()} "
+              f"of {len(old[compared])} rows")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the preprocessing functions in scripts/preprocess.py")
+    arg_parser.add_argument('--rows', type=int, default=1000000)
+    arg_parser.add_argument('--baseline-rows', type=int, default=20000,
+                            help="rows the row by row versions run on, their time for --rows is extrapolated")
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    benchmark_suburb_extraction(args.rows, args.baseline_rows, args.repeat, args.seed)
+    print()
+    benchmark_categorisation(args.rows, args.baseline_rows, args.repeat, args.seed)
+    print()
+    benchmark_annual_increase(args.rows, args.baseline_rows, args.repeat, args.seed)
+    print()
+    benchmark_numbers(args.rows, args.baseline_rows, args.repeat, args.seed)
@@ -0,0 +1,132 @@
+import os
+import gzip
+import json
+import time
+import argparse
+from scripts.scrape import CACHE_DIR, parse_property_page_css, parse_property_page_json, parse_property_page_soup
+
+
+def load_listing_corpus(cache_dir, limit=None):
+    """
+    Loads saved listing pages from the scraper's HTTP cache.
+
+    Parameters:
+    cache_dir: directory of an HTTPCache.
+    limit: optional maximum number of pages to load.
+
+    Returns:
+    list: (url, html) pairs of the cached listing pages, index pages are left out. Empty if
+    nothing has been cached yet.
+    """
+    corpus = []
+    if not os.path.isdir(cache_dir):
+        return corpus
+    for file_name in sorted(os.listdir(cache_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        with open(os.path.join(cache_dir, file_name), encoding='utf-8') as f:
+            url = json.load(f)['url']
+        if '/rent/' in url:
+            continue
+        with gzip.open(os.path.join(cache_dir, file_name[:-len('.json')] + '.html.gz'), 'rt', encoding='utf-8') as f:
+            corpus.append((url, f.read()))
+        if limit and len(corpus) >= limit:
+            break
+    return corpus
+
+
+def time_parser(parser, corpus, repeat=3):
+    """
+    Times a listing parser over a corpus of pages.
+
+    Parameters:
+    parser: function taking (html, url) and returning a record.
+    corpus: (url, html) pairs.
+    repeat: number of runs, the fastest one is reported.
+
+    Returns:
+    tuple: (pages parsed per second, records) where records holds the parser's output
+    for each page, or the exception it raised.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        records = []
+        start = time.perf_counter()
+        for url, html in corpus:
+            try:
+                records.append(parser(html, url))
+            except Exception as e:
+                records.append(e)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best, records
+
+
+def fill_rates(records):
+    """
+    Returns the share of records that have a value for each field, counting a parser
+    exception or a missing record as no values at all.
+    """
+    counts, fields = {}, []
+    for record in records:
+        if isinstance(record, dict):
+            for field, value in record.items():
+                if field not in counts:
+                    counts[field] = 0
+                    fields.append(field)
+                counts[field] += value not in ('N/A', '', None)
+    return {field: counts[field] / len(records) for field in fields}
+
+
+def benchmark_parsers(corpus, parsers, repeat=3):
+    """
+    Prints the pages per second of each parser, how often it disagrees with the first one
+    and how often each field gets filled.
+
+    Parameters:
+    corpus: (url, html) pairs.
+    parsers: dict of parser name to parser function, the first one is the baseline.
+    repeat: number of runs per parser.
+    """
+    if not corpus:
+        print("No listing pages to parse.")
+        return
+    print(f"Parsing {len(corpus)} listing pages, best of {repeat} runs")
+    baseline_rate, baseline_records = None, None
+    for name, parser in parsers.items():
+        rate, records = time_parser(parser, corpus, repeat)
+        if baseline_rate is None:
+            baseline_rate, baseline_records = rate, records
+            print(f"{name:>10}: {rate:8.1f} pages/s")
+            rates = fill_rates(records)
+            print(' ' * 12 + ', '.join(f"{field} {share:.0%}" for field, share in rates.items() if field != 'URL'))
+            continue
+        # only the baseline's fields are compared, so extra fields don't count as a difference
+        mismatches = sum(
+            not (isinstance(ours, Exception) and isinstance(theirs, Exception))
+            and (not isinstance(ours, dict) or not isinstance(theirs, dict)
+                 or any(ours.get(field) != value for field, value in theirs.items()))
+            for ours, theirs in zip(records, baseline_records)
+        )
+        print(f"{name:>10}: {rate:8.1f} pages/s ({rate / baseline_rate:.1f}x), "
+              f"{mismatches} records differ from the baseline")
+        rates = fill_rates(records)
+        print(' ' * 12 + ', '.join(f"{field} {share:.0%}" for field, share in rates.items() if field != 'URL'))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the listing page parsers in scripts/scrape.py")
+    arg_parser.add_argument('--corpus', default=CACHE_DIR, help="HTTP cache directory holding saved listing pages")
+    arg_parser.add_argument('--limit', type=int, default=None, help="maximum number of pages to parse")
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    corpus = load_listing_corpus(args.corpus, args.limit)
+    if not corpus:
+        # benchmark_crawl's synthetic pages lack the markup the CSS parsers read, so only real pages will do
+        arg_parser.exit(1, f"No saved listing pages in {args.corpus}. Run a crawl to fill the HTTP cache, "
+                           f"or point --corpus at one.\n")
+    print("CSS selectors, BeautifulSoup against lxml")
+    benchmark_parsers(corpus, {'soup': parse_property_page_soup, 'lxml': parse_property_page_css}, args.repeat)
+    print("\nCSS selectors against the embedded JSON state")
+    benchmark_parsers(corpus, {'css': parse_property_page_css,
+                               'json': lambda html, url: parse_property_page_json(html, url) or {}}, args.repeat)
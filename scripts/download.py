@@ -1,8 +1,14 @@
 import os
+import time
+import hashlib
+import random
 import requests
 import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlencode
-from urllib.request import urlretrieve
 import shutil
 import zipfile
 
@@ -10,42 +16,232 @@ data_dir = '../data/'
 landing_dir = data_dir + 'landing/'
 raw_dir = data_dir + 'raw/'
 
-def fetch_data_from_api(ids, start_period, dimension_at_observation, output_file):
-    base_url = "https://api.data.abs.gov.au/data/ABS,ABS_REGIONAL_ASGS2021,/.."
+ABS_API_URL = "https://api.data.abs.gov.au/data/ABS,ABS_REGIONAL_ASGS2021,/.."
+BATCH_SIZE = 50
+# keeps request URLs well under the limits of the proxies in front of the API
+MAX_URL_LENGTH = 2000
+N_WORKERS = 8
+MAX_RETRIES = 4
+BACKOFF = 1
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_NAME = '.manifest.json'
+ARCHIVE_NAME = 'order.zip'
+
+
+class BatchTooLong(Exception):
+    """Raised when the API rejects a batch because its URL is too long."""
+
+
+def make_session(workers=N_WORKERS):
+    """
+    Creates a requests session whose connection pool is large enough for `workers` threads,
+    so every batch reuses a kept-alive connection instead of opening a new one.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def batch_url(batch_ids, query):
+    return ABS_API_URL + '+'.join(map(str, batch_ids)) + '.A?' + query
+
+
+def make_batches(ids, query, batch_size=BATCH_SIZE, max_url_length=MAX_URL_LENGTH):
+    """
+    Splits ids into batches of at most `batch_size` ids whose request URL fits in `max_url_length`.
+
+    Parameters:
+    ids: the region ids to fetch.
+    query: the encoded query string of the request.
+    batch_size: the most ids in one request.
+    max_url_length: the longest URL the API accepts.
+
+    Returns:
+    list: lists of ids, in the order of `ids`.
+    """
+    batches, batch = [], []
+    for region_id in ids:
+        if batch and (len(batch) == batch_size or len(batch_url(batch + [region_id], query)) > max_url_length):
+            batches.append(batch)
+            batch = []
+        batch.append(region_id)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def fetch_batch(session, batch_ids, query, max_retries=MAX_RETRIES, backoff=BACKOFF):
+    """
+    Fetches one batch of ids, retrying with exponential backoff when the request times out,
+    the connection drops or the API answers with a 429 or 5xx.
+
+    Parameters:
+    session: requests session to send the request with.
+    batch_ids: the ids of the batch.
+    query: the encoded query string of the request.
+    max_retries: number of retries before giving up on the batch.
+    backoff: seconds to wait before the first retry, doubled after each one.
+
+    Returns:
+    dict: the parsed JSON response.
+    """
+    url = batch_url(batch_ids, query)
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(url, timeout=60)
+            if response.status_code == 414:
+                raise BatchTooLong(f"URL of {len(url)} characters is too long")
+            if response.status_code in RETRY_STATUSES and attempt < max_retries:
+                retry_after = response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt
+                print(f"HTTP error {response.status_code} for batch starting at {batch_ids[0]}, "
+                      f"retrying in {delay:.1f}s...")
+                time.sleep(delay + random.uniform(0, backoff))
+                continue
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"Request error for batch starting at {batch_ids[0]}: {err}, retrying in {delay:.1f}s...")
+            time.sleep(delay + random.uniform(0, backoff))
+
+
+def flatten_sdmx(response, labels=('MEASURE',)):
+    """
+    Flattens an SDMX-JSON response fetched with dimensionAtObservation=AllDimensions into a
+    table with one row per observation.
+
+    Observations are keyed by strings like "0:3:1:0:2" that hold the position of each
+    dimension's value, so every dimension becomes a column of codes (e.g. MEASURE, ASGS_2021
+    and TIME_PERIOD) next to the OBS_VALUE column.
+
+    Parameters:
+    response: the parsed JSON response of the API.
+    labels: dimensions that also get a `<dimension>_NAME` column with the value's name.
+
+    Returns:
+    pd.DataFrame: the observations of the response.
+    """
+    # SDMX-JSON 2.0 wraps the message in "data" and lists "structures", 1.0 doesn't
+    message = response.get('data', response)
+    structure = message['structure'] if 'structure' in message else message['structures'][0]
+    dimensions = structure['dimensions']['observation']
+    observations = message['dataSets'][0].get('observations', {})
+
+    keys = np.array([key.split(':') for key in observations], dtype=np.int32).reshape(len(observations),
+                                                                                     len(dimensions))
+    table = {}
+    for i, dimension in enumerate(dimensions):
+        codes = np.array([value['id'] for value in dimension['values']], dtype=object)
+        table[dimension['id']] = codes[keys[:, i]]
+        if dimension['id'] in labels:
+            names = np.array([value.get('name', value['id']) for value in dimension['values']], dtype=object)
+            table[f"{dimension['id']}_NAME"] = names[keys[:, i]]
+    table['OBS_VALUE'] = np.array([observation[0] for observation in observations.values()], dtype=np.float64)
+    return pd.DataFrame(table)
+
+
+def save_sdmx_table(responses, table_file):
+    """
+    Flattens SDMX-JSON responses into one table and saves it as Parquet, sorted by its
+    dimensions so each region's measures and years sit together.
+
+    Parameters:
+    responses: parsed JSON responses of the API.
+    table_file: path of the Parquet file.
+    """
+    table = pd.concat([flatten_sdmx(response) for response in responses], ignore_index=True)
+    dimensions = [column for column in table.columns if column != 'OBS_VALUE' and not column.endswith('_NAME')]
+    table = table.drop_duplicates(subset=dimensions).sort_values(dimensions, ignore_index=True)
+    for column in table.columns:
+        if column != 'OBS_VALUE':
+            table[column] = table[column].astype('category')
+    os.makedirs(os.path.dirname(table_file), exist_ok=True)
+    table.to_parquet(table_file, index=False)
+    print(f"{len(table)} observations saved to {table_file}.")
+
+
+def fetch_data_from_api(ids, start_period, dimension_at_observation, output_file, table_file=None,
+                        workers=N_WORKERS, batch_size=BATCH_SIZE, max_url_length=MAX_URL_LENGTH,
+                        max_retries=MAX_RETRIES):
+    """
+    Fetches ABS regional data for a list of region ids, several batches at a time.
+
+    Batches go out concurrently over one pooled session. Each batch is retried on its own
+    with backoff, and a batch the API rejects as too long is split in half and both halves
+    are fetched instead. The responses are written to `output_file` as NDJSON, one response
+    per line in batch order, and flattened into a table of observations in `table_file`.
+
+    Parameters:
+    ids: the SA2 (and SA3) ids to fetch.
+    start_period: the first year of data.
+    dimension_at_observation: the SDMX dimensionAtObservation parameter.
+    output_file: path of the NDJSON file the responses are saved to.
+    table_file: optional path of a Parquet file for the flattened observations, see `save_sdmx_table`.
+    workers: number of batches fetched at the same time.
+    batch_size: the most ids in one request.
+    max_url_length: the longest URL the API accepts.
+    max_retries: number of retries of each batch.
+
+    Returns:
+    list: the ids of batches that still failed after all retries.
+    """
     params = {
         'startPeriod': start_period,
         'dimensionAtObservation': dimension_at_observation,
     }
-    
+    query = urlencode(params)
+
     # Ensure the directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-    for i in range(0, len(ids), 50):  # Split IDs into batches of 50
-        batch_ids = ids[i:i + 50]
-        url = base_url + '+'.join(map(str, batch_ids)) + '.A?' + urlencode(params)
+    batches = make_batches(ids, query, batch_size, max_url_length)
+    print(f"Fetching {len(ids)} ids from the API in {len(batches)} batches with {workers} workers...")
+    results, failed = {}, []
+    session = make_session(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # keyed by the position of the batch's first id, which keeps the output in id order
+        pending, position = {}, 0
+        for batch in batches:
+            pending[executor.submit(fetch_batch, session, batch, query, max_retries)] = (position, batch)
+            position += len(batch)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                position, batch = pending.pop(future)
+                try:
+                    results[position] = future.result()
+                    print(f"Fetched batch of {len(batch)} ids starting at {batch[0]}.")
+                except BatchTooLong as err:
+                    if len(batch) == 1:
+                        print(f"Giving up on id {batch[0]}: {err}")
+                        failed.extend(batch)
+                        continue
+                    print(f"{err}, splitting the batch starting at {batch[0]} in half.")
+                    half = len(batch) // 2
+                    for part, offset in ((batch[:half], 0), (batch[half:], half)):
+                        pending[executor.submit(fetch_batch, session, part, query, max_retries)] = (position + offset, part)
+                except Exception as err:
+                    print(f"Batch starting at {batch[0]} failed after {max_retries} retries: {err}")
+                    failed.extend(batch)
+    session.close()
+
+    responses = [results[position] for position in sorted(results)]
+    with open(output_file, 'w') as file:
+        for response in responses:
+            file.write(json.dumps(response) + '\n')
+    print(f"Data from {len(results)} batches saved successfully to {output_file}.")
+    if table_file and responses:
+        save_sdmx_table(responses, table_file)
+    if failed:
+        print(f"{len(failed)} ids could not be fetched: {failed}")
+    return failed
 
-        try:
-            print(f"Fetching data from the API with batch: {batch_ids}...")
-            response = requests.get(url, timeout=60)  # Set a longer timeout if necessary
-            response.raise_for_status()  # Raise an error for bad responses
-
-            # Parsing the response
-            data = response.json()
-            print("Data fetched successfully.")
-
-            # Append or save the data (in this example, it appends to a file)
-            with open(output_file, 'a') as file:
-                json.dump(data, file, indent=4)  # indent=4 for pretty printing
-            print(f"Data saved successfully to {output_file}.")
-
-        except requests.exceptions.HTTPError as http_err:
-            print(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            print(f"Request error occurred: {req_err}")
-        except Exception as err:
-            print(f"Other error occurred: {err}")
-
-    
         
 ids = [217041480, 217041479, 217041478, 217041477, 217031475, 217031476, 217031473, 217031472, 217031474, 
 217031471, 217011421, 217011423, 217011422, 217011420, 21704, 21703, 21701, 204011062, 203021488, 
@@ -93,37 +289,248 @@ ids = [217041480, 217041479, 217041478, 217041477, 217031475, 217031476, 2170314
 206031113, 206021500, 206021499, 206021112, 206021110, 206011498, 206011497, 206011496, 206011495, 
 206011109, 206011107, 206011106
 ]
-fetch_data_from_api(ids, '2020', 'AllDimensions', 'data/raw/raw_abs.json')
 
 
-def download_from_vic_datashare(url, output_dir, dataset_name):
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def range_validator(headers):
+    """
+    Picks the validator to send as If-Range when resuming a download: a strong ETag, or else
+    the Last-Modified date. Weak ETags aren't allowed in If-Range.
+
+    Returns:
+    str: the validator, or None if the server sent neither.
+    """
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def download_file(url, path, sha256=None, session=None, chunk_size=CHUNK_SIZE, max_retries=MAX_RETRIES,
+                  backoff=BACKOFF):
+    """
+    Streams a file to disk in chunks. The download goes to `<path>.part` first, and if that
+    already exists from an interrupted run it is resumed with an HTTP Range request instead
+    of starting over. A dropped connection is resumed the same way, with backoff. The ETag
+    or Last-Modified the part was downloaded under is saved next to it and sent as If-Range,
+    so a file that changed on the server in the meantime is downloaded again from the start.
+
+    Parameters:
+    url: the file to download.
+    path: where to save it.
+    sha256: optional expected SHA-256 of the file, a mismatch raises a ValueError.
+    session: optional requests session.
+    chunk_size: bytes written at a time.
+    max_retries: number of times a dropped download is resumed.
+    backoff: seconds to wait before the first retry, doubled after each one.
+
+    Returns:
+    str: the SHA-256 of the downloaded file.
+    """
+    session = session or make_session(1)
+    part = f"{path}.part"
+    validator_path = f"{part}.validator"
+    for attempt in range(max_retries + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        validator = None
+        if offset and os.path.exists(validator_path):
+            with open(validator_path) as f:
+                validator = f.read().strip() or None
+        # without a validator there is no telling whether the part still belongs to the file
+        headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if validator else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=60) as response:
+                if validator and response.status_code == 416:
+                    # the partial file is already complete
+                    break
+                response.raise_for_status()
+                if validator and response.status_code == 206:
+                    print(f"Resuming download of {url} at {offset / 1024 ** 2:.1f} MB.")
+                else:
+                    if offset:
+                        print(f"Partial download of {url} can't be resumed, downloading it from the start.")
+                    offset = 0
+                    with open(validator_path, 'w') as f:
+                        f.write(range_validator(response.headers) or '')
+                with open(part, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as err:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"Download of {url} interrupted: {err}, resuming in {delay:.1f}s...")
+            time.sleep(delay)
+
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    digest = file_sha256(part)
+    if sha256 and digest != sha256.lower():
+        os.remove(part)
+        raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+    os.replace(part, path)
+    return digest
+
+
+def remote_version(session, url):
+    """
+    Asks the server for the ETag, Last-Modified and size of a file without downloading it.
+
+    Returns:
+    dict: the file's version, or None if the server can't be reached.
+    """
+    try:
+        response = session.head(url, allow_redirects=True, timeout=30)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as err:
+        print(f"Could not check {url} for changes: {err}")
+        return None
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+            'size': response.headers.get('Content-Length')}
+
+
+def read_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def dataset_is_current(manifest, output_dir, url, sha256=None, remote=None):
+    """
+    Checks whether an extracted dataset still matches its manifest: it was downloaded from the
+    same URL, none of its files are missing or changed in size, and the archive is the one
+    expected, judged by `sha256` if given or else by the server's ETag, Last-Modified and size.
+    """
+    if not manifest or manifest.get('url') != url:
+        return False
+    for file_name, size in manifest.get('files', {}).items():
+        path = os.path.join(output_dir, file_name)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return False
+    if sha256:
+        return manifest.get('sha256') == sha256.lower()
+    if remote is None:
+        # the server can't be reached, the local copy is the best there is
+        return True
+    return all(remote[key] is None or remote[key] == manifest.get(key) for key in ('etag', 'last_modified', 'size'))
+
+
+def layer_members(zip_ref, dataset_name, layers=None):
+    """
+    Lists the files of a Vicmap order's layer, which are hidden in
+    `ll_gda94/esrishape/whole_of_dataset/victoria/<dataset_name>/`.
+
+    Parameters:
+    zip_ref: the opened order.
+    dataset_name: the folder of the layer, e.g. "VMFEAT".
+    layers: optional shapefile names to keep, e.g. ["GEOMARK_POLYGON"], defaults to all of them.
+
+    Returns:
+    list: the paths of the files inside the zip.
+    """
+    prefix = f'll_gda94/esrishape/whole_of_dataset/victoria/{dataset_name}/'
+    members = [name for name in zip_ref.namelist() if name.startswith(prefix) and not name.endswith('/')]
+    if layers:
+        members = [name for name in members if os.path.basename(name).split('.')[0] in layers]
+    return members
+
+
+def layer_paths(output_dir, manifest):
+    """
+    Returns the path geopandas should read each shapefile of a dataset from, a `zip://` path
+    into the kept archive when the dataset is read in place.
+    """
+    if manifest.get('in_place'):
+        archive = os.path.abspath(os.path.join(output_dir, ARCHIVE_NAME))
+        return {layer: f"zip://{archive}!{member}" for layer, member in manifest['layers'].items()}
+    return {layer: os.path.join(output_dir, os.path.basename(member)) for layer, member in manifest['layers'].items()}
+
+
+def download_from_vic_datashare(url, output_dir, dataset_name, sha256=None, layers=None, in_place=False):
+    """
+    Downloads a Vicmap shapefile order and extracts its layer into `output_dir`.
+
+    Only the files of the layer are extracted, straight from the zip to `output_dir`. With
+    `in_place` nothing is extracted at all: the zip is kept in `output_dir` and the shapefiles
+    are read through `zip://` paths.
+
+    A `.manifest.json` in `output_dir` records the archive's checksum and version and the
+    extracted files, so a run where the dataset hasn't changed skips both the download and
+    the extraction. The archive is streamed to disk with resume, and a new extraction only
+    replaces the old one once it has finished.
+
+    Parameters:
+    url: the order's zip file.
+    output_dir: directory the shapefile is extracted to.
+    dataset_name: the folder of the layer inside the order, e.g. "VMFEAT".
+    sha256: optional expected SHA-256 of the zip file.
+    layers: optional shapefile names to keep, e.g. ["GEOMARK_POLYGON"], defaults to all of them.
+    in_place: keep the zip instead of extracting it.
+
+    Returns:
+    dict: the path to pass to geopandas.read_file for each shapefile, keyed by its name.
+    """
+    session = make_session(1)
+    manifest = read_manifest(output_dir)
+    remote = remote_version(session, url)
+    if (manifest and manifest.get('in_place', False) == in_place and manifest.get('requested') == layers
+            and dataset_is_current(manifest, output_dir, url, sha256, remote)):
+        print(f"{output_dir} is up to date, skipping the download.")
+        return layer_paths(output_dir, manifest)
+
     zip_dir = f"{output_dir}.zip"
-    
+
     # Retrieve file from url
-    urlretrieve(url, zip_dir) 
+    digest = download_file(url, zip_dir, sha256, session)
+    session.close()
+
+    # Build the new copy next to the old one, which stays in place until the new one is complete
+    staging_dir = f"{output_dir}.tmp"
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    os.makedirs(staging_dir)
+
+    with zipfile.ZipFile(zip_dir, 'r') as zip_ref:
+        members = layer_members(zip_ref, dataset_name, layers)
+        if not in_place:
+            # Write the layer's files straight to the top folder for ease of coding
+            for member in members:
+                with zip_ref.open(member) as source, open(os.path.join(staging_dir, os.path.basename(member)), 'wb') as target:
+                    shutil.copyfileobj(source, target, CHUNK_SIZE)
+
+    if in_place:
+        os.replace(zip_dir, os.path.join(staging_dir, ARCHIVE_NAME))
+    else:
+        # Deletes the zip file as the layer has its own folder now
+        os.remove(zip_dir)
+
+    files = {name: os.path.getsize(os.path.join(staging_dir, name)) for name in sorted(os.listdir(staging_dir))}
+    manifest = {'url': url, 'sha256': digest, **(remote or {}), 'in_place': in_place, 'requested': layers,
+                'layers': {os.path.basename(member).split('.')[0]: member for member in members
+                           if member.lower().endswith('.shp')},
+                'files': files}
+    with open(os.path.join(staging_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=4)
 
     # Check if the path exists
     if os.path.exists(output_dir):
         shutil.rmtree(output_dir)
-    
-    # Opens zip file
-    with zipfile.ZipFile(zip_dir, 'r') as zip_ref:
-        zip_ref.extractall(output_dir)
-
-    # Deletes the zip file as the unzipped file has its own folder now
-    os.remove(zip_dir)
-
-    # Data is hidden in folders 
-    shapefile_dir = output_dir + f'/ll_gda94/esrishape/whole_of_dataset/victoria/{dataset_name}/'
-    
-    # Move all files into the topmost folder for ease of coding
-    file_names = os.listdir(shapefile_dir)
-    for file_name in file_names:
-        path = os.path.join(shapefile_dir, file_name)
-        # Force move even if file exists
-        shutil.move(path, f"{output_dir}/")
-
-    # Remove the empty folder within the folder within the folder etc
-    shutil.rmtree(f"{output_dir}/ll_gda94")
-    
-    return
\ No newline at end of file
+    os.replace(staging_dir, output_dir)
+    print(f"{'Kept' if in_place else 'Extracted'} {len(members)} files of {dataset_name} in {output_dir}.")
+
+    return layer_paths(output_dir, manifest)
+
+
+if __name__ == "__main__":
+    fetch_data_from_api(ids, '2020', 'AllDimensions', 'data/raw/raw_abs.ndjson', 'data/raw/raw_abs.parquet')
@@ -0,0 +1,79 @@
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset
+
+# the scraped listings, partitioned by crawl date and postcode, see scrape.save_parquet
+PARQUET_DIR = 'data/landing/rental_scrape_parquet'
+
+# the suburb and postcode an address ends in, e.g. "3/12 Smith St, Seddon West VIC 3011", written
+# for both Python's re and Arrow's RE2. Only Victorian addresses match, "Richmond NSW 2753" doesn't
+ADDRESS_LOCATION_REGEX = r'(?i),\s*(?P<suburb>[^,]+?)\s+VIC\s+(?P<postcode>\d{4})\s*$'
+ADDRESS_LOCATION_PATTERN = re.compile(ADDRESS_LOCATION_REGEX)
+
+
+def latest_crawl_date(dataset_dir=PARQUET_DIR):
+    return max(name.split('=', 1)[1] for name in os.listdir(dataset_dir) if name.startswith('CrawlDate='))
+
+
+def scrape_partitioning():
+    return pa.dataset.partitioning(pa.schema([('CrawlDate', pa.string()), ('Postcode', pa.int16())]), flavor='hive')
+
+
+def read_scrape(dataset_dir=PARQUET_DIR, columns=None, crawl_date=None, postcodes=None):
+    """
+    Reads scraped listings from the Parquet dataset written by `save_parquet`.
+
+    Parameters:
+    dataset_dir: the root directory of the Parquet dataset.
+    columns: the columns to load, defaults to all of them.
+    crawl_date: ISO date of the crawl to load, defaults to the latest one.
+    postcodes: only load listings in these postcodes.
+
+    Returns:
+    pd.DataFrame: the listings of that crawl.
+    """
+    if crawl_date is None:
+        crawl_date = latest_crawl_date(dataset_dir)
+    filters = [('CrawlDate', '=', crawl_date)]
+    if postcodes is not None:
+        filters.append(('Postcode', 'in', [int(postcode) for postcode in postcodes]))
+    return pd.read_parquet(dataset_dir, columns=columns, filters=filters, partitioning=scrape_partitioning())
+
+
+def iter_scrape(dataset_dir=PARQUET_DIR, columns=None, crawl_date=None, postcodes=None, batch_size=100_000):
+    """
+    Reads scraped listings like `read_scrape`, a batch at a time, so a crawl never has to fit
+    in memory at once.
+
+    Parameters:
+    dataset_dir: the root directory of the Parquet dataset.
+    columns: the columns to load, defaults to all of them.
+    crawl_date: ISO date of the crawl to load, defaults to the latest one.
+    postcodes: only load listings in these postcodes.
+    batch_size: the most listings in a batch.
+
+    Yields:
+    pd.DataFrame: the next batch of listings of that crawl.
+    """
+    if crawl_date is None:
+        crawl_date = latest_crawl_date(dataset_dir)
+    dataset = pa.dataset.dataset(dataset_dir, format='parquet', partitioning=scrape_partitioning())
+    condition = pa.dataset.field('CrawlDate') == crawl_date
+    if postcodes is not None:
+        condition &= pa.dataset.field('Postcode').isin([int(postcode) for postcode in postcodes])
+    # no read-ahead, only the batch being built is held in memory
+    batches, rows = [], 0
+    for batch in dataset.to_batches(columns=columns, filter=condition, batch_size=batch_size,
+                                    batch_readahead=0, fragment_readahead=0):
+        # every postcode is its own file, so small batches are put together up to batch_size
+        while batch.num_rows:
+            batches.append(batch.slice(0, batch_size - rows))
+            rows += batches[-1].num_rows
+            batch = batch.slice(batches[-1].num_rows)
+            if rows == batch_size:
+                yield pa.Table.from_batches(batches).to_pandas()
+                batches, rows = [], 0
+    if rows:
+        yield pa.Table.from_batches(batches).to_pandas()
@@ -1,7 +1,15 @@
+import os
+import time
+import argparse
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import re
+import calendar
 from dateutil import parser
 from datetime import datetime
+from scripts.landing import PARQUET_DIR, ADDRESS_LOCATION_REGEX, ADDRESS_LOCATION_PATTERN, iter_scrape
+from scripts.schema import write_curated
 suburb_postcode_mapping = {
     'melbourne': '3004',
  'east melbourne': '3002',
@@ -1005,6 +1013,56 @@ suburb_postcode_mapping = {
  'invermay': '3352'
 }
 
+# addresses in another state, whose suburb may share a name with a Victorian one
+OTHER_STATE_REGEX = r'(?i)\b(?:NSW|QLD|SA|WA|TAS|NT|ACT)\s+\d{4}\s*$'
+OTHER_STATE_PATTERN = re.compile(OTHER_STATE_REGEX)
+TOKEN_PATTERN = re.compile(r"[a-z']+")
+
+
+class SuburbMatcher:
+    '''Token trie over the suburb names of a suburb to postcode mapping.
+
+    Finds the longest suburb name in an address in one pass over its words, so 'East Melbourne'
+    is never mistaken for 'Melbourne' and 'Seddon West' for 'Seddon', whatever the order of the
+    mapping. When two names are equally long the later one wins, as the suburb comes after the
+    street in an address.
+
+    Parameters:
+    mapping: dictionary of lower case suburb names to postcodes
+    '''
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.root = {}
+        for suburb in mapping:
+            node = self.root
+            for token in TOKEN_PATTERN.findall(suburb.lower()):
+                node = node.setdefault(token, {})
+            # None can't be a token, so it marks the end of a name
+            node[None] = suburb
+
+    def match(self, address):
+        '''Returns the longest suburb name in the address, or None if there isn't one'''
+        tokens = TOKEN_PATTERN.findall(address.lower())
+        best, best_length = None, 0
+        for start in range(len(tokens)):
+            node = self.root
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if None in node and end - start + 1 >= best_length:
+                    best, best_length = node[None], end - start + 1
+        return best
+
+    def match_many(self, addresses):
+        '''Returns the longest suburb name in each address, None for missing addresses'''
+        return [self.match(address) if isinstance(address, str) else None for address in addresses]
+
+
+suburb_matcher = SuburbMatcher(suburb_postcode_mapping)
+suburb_titles = {suburb: suburb.title() for suburb in suburb_postcode_mapping}
+
+
 def extract_suburb_postcode(address):
     '''This function outputs the suburb and postcode based on the address
     
@@ -1012,13 +1070,56 @@ def extract_suburb_postcode(address):
     address: address string that contains the suburb
     
     Returns:
-    suburb and postcode
+    suburb and postcode, Unknown if the address ends in a suburb that isn't in the mapping or
+    is in another state
     '''
-    address_lower = address.lower() 
-    for suburb, postcode in suburb_postcode_mapping.items():
-        if suburb in address_lower:
-            return suburb.title(), postcode
-    return 'Unknown', 'Unknown'
+    match = ADDRESS_LOCATION_PATTERN.search(address)
+    # the matcher would find a street named after a suburb, so it is only used when the
+    # address doesn't end in "Suburb VIC 3000" at all
+    if match:
+        suburb = match.group('suburb').lower()
+    elif OTHER_STATE_PATTERN.search(address):
+        return 'Unknown', 'Unknown'
+    else:
+        suburb = suburb_matcher.match(address)
+    if suburb not in suburb_postcode_mapping:
+        return 'Unknown', 'Unknown'
+    return suburb.title(), suburb_postcode_mapping[suburb]
+
+
+def extract_suburb_postcodes(addresses):
+    '''This function outputs the suburb and postcode of a whole column of addresses at once
+    
+    The trailing "Suburb VIC 3000" of every address is parsed with one regular expression and
+    looked up in suburb_postcode_mapping. Only addresses that don't end in that pattern go
+    through the SuburbMatcher, one ending in a suburb that isn't in the mapping or in another
+    state is Unknown.
+    
+    Parameters:
+    addresses: series of address strings
+    
+    Returns:
+    dataframe with the Suburb and Postcode of each address, as extract_suburb_postcode gives
+    them, and the AddressPostcode written in the address itself
+    '''
+    addresses = pd.Series(addresses)
+    # Arrow runs the pattern over the whole column in C++, much faster than Series.str.extract
+    array = pa.array(addresses.astype(object), type=pa.string(), from_pandas=True)
+    parsed = pc.extract_regex(array, ADDRESS_LOCATION_REGEX)
+    suburbs = pd.Series(pc.utf8_lower(pc.struct_field(parsed, 'suburb')).to_pylist(), index=addresses.index,
+                        dtype=object)
+    suburbs = suburbs.where(suburbs.isin(suburb_postcode_mapping.keys()), None)
+    other_state = pc.fill_null(pc.match_substring_regex(array, OTHER_STATE_REGEX), False)
+    rest = pd.Series(pc.and_(pc.is_null(parsed), pc.invert(other_state)).to_numpy(zero_copy_only=False),
+                     index=addresses.index) & addresses.notna()
+    if rest.any():
+        suburbs[rest] = suburb_matcher.match_many(addresses[rest])
+    return pd.DataFrame({
+        'Suburb': suburbs.map(suburb_titles).fillna('Unknown'),
+        'Postcode': suburbs.map(suburb_postcode_mapping).fillna('Unknown'),
+        'AddressPostcode': pd.Series(pc.struct_field(parsed, 'postcode').to_pylist(), index=addresses.index,
+                                     dtype=object).fillna('Unknown'),
+    }, index=addresses.index)
 
 
 def categorise_property(row):
@@ -1053,18 +1154,40 @@ def categorise_property(row):
     else:
         return 'House'
     
+# the leading token of the address, e.g. "3/12" or "12A", has a slash or a letter for units
+UNIT_ADDRESS_PATTERN = re.compile(r'^[^ ]*[/A-Za-z]')
+
+
+def categorise_properties(df):
+    '''
+    This function categorizes a whole dataframe of properties at once, giving the same labels
+    as categorise_property.
+    
+    Parameters:
+    df: dataframe with 'Address' and 'Property Type' columns
+    
+    Returns:
+    series of property types
+    '''
+    townhouse = df['Property Type'].str.contains('Townhouse', regex=False, na=False)
+    unit = df['Address'].str.contains(UNIT_ADDRESS_PATTERN, na=False)
+    labels = pd.Series('House', index=df.index, dtype=object)
+    labels[unit] = 'Apartment / Unit / Flat'
+    labels[townhouse] = 'Townhouse'
+    return labels
+
 def calculate_annual_increase(row):
     historical_prices = row['Historical Prices']
     
     if pd.isna(historical_prices):
-        return pd.Series([None, None, None, None])  # Return None for all outputs if no historical prices
+        return pd.Series([None] * 6)  # Return None for all outputs if no historical prices
     
     # Use regex to extract date-price pairs like 'August 2023$1,100'
     date_price_pairs = re.findall(r'([A-Za-z]+\s\d{4})\$([\d,]+)(?:\s*-\s*\$[\d,]*)?', historical_prices)
     
     # Convert extracted data to usable format
     if not date_price_pairs:
-        return pd.Series([None, None, None, None])
+        return pd.Series([None] * 6)
     
     # Parse the dates and prices
     dates_prices = [(parser.parse(date), float(price.replace(',', ''))) for date, price in date_price_pairs]
@@ -1087,6 +1210,74 @@ def calculate_annual_increase(row):
     
     return pd.Series([oldest_price, oldest_date, newest_price, newest_date, months_diff, annual_increase_pct])
 
+
+# e.g. 'August 2023$1,100' or 'Aug 2023$1,100 - $1,200'
+HISTORICAL_PRICE_PATTERN = r'(?P<month>[A-Za-z]+)\s(?P<year>\d{4})\$(?P<price>[\d,]+)(?:\s*-\s*\$[\d,]*)?'
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTHS['sept'] = 9
+ANNUAL_INCREASE_COLUMNS = ['Oldest Price', 'Oldest Date', 'Newest Price', 'Newest Date', 'Months', 'Annual Increase']
+
+
+def calculate_annual_increases(historical_prices):
+    '''
+    This function calculates the annual increase of a whole column of historical prices at once,
+    the batch version of calculate_annual_increase.
+    
+    Every 'Month YYYY$price' pair of the column is extracted in one pass and dated to the first
+    of its month, then the oldest and newest price of each listing are found with a groupby.
+    
+    Parameters:
+    historical_prices: series of historical price strings
+    
+    Returns:
+    dataframe with the Oldest Price, Oldest Date, Newest Price, Newest Date, the Months between
+    them and the Annual Increase in percent of each listing, missing where a listing has no prices
+    '''
+    historical_prices = pd.Series(historical_prices)
+    result = pd.DataFrame(index=historical_prices.index, columns=ANNUAL_INCREASE_COLUMNS).astype({
+        'Oldest Price': 'Float64', 'Oldest Date': 'datetime64[ns]', 'Newest Price': 'Float64',
+        'Newest Date': 'datetime64[ns]', 'Months': 'Int64', 'Annual Increase': 'Float64'})
+
+    # mark the end of every pair and split on the marks, so each piece holds at most one pair
+    text = pa.array(historical_prices.astype(object).where(historical_prices.notna(), None), type=pa.string())
+    pieces = pc.split_pattern(pc.replace_substring_regex(text, pattern=HISTORICAL_PRICE_PATTERN,
+                                                         replacement='\\0\x1f'), pattern='\x1f')
+    pairs = pc.extract_regex(pc.list_flatten(pieces), pattern=HISTORICAL_PRICE_PATTERN)
+    month = pc.index_in(pc.utf8_lower(pc.struct_field(pairs, 'month')), value_set=pa.array(list(MONTHS)))
+    # pieces after the last pair and unknown months are dropped
+    found = pc.is_valid(month)
+    pairs = pairs.filter(found)
+    if len(pairs) == 0:
+        return result
+    prices = pd.DataFrame({
+        'listing': pc.list_parent_indices(pieces).filter(found).to_numpy(),
+        'month': pc.cast(pc.struct_field(pairs, 'year'), pa.int32()).to_numpy() * 12
+                 + pa.array(list(MONTHS.values())).take(month.filter(found)).to_numpy() - 1,
+        'price': pc.cast(pc.replace_substring(pc.struct_field(pairs, 'price'), ',', ''), pa.float64()).to_numpy(),
+    })
+
+    # stable, so for prices in the same month the first one listed is the oldest and the last the newest
+    prices = prices.sort_values(['listing', 'month'], kind='stable')
+    listings = prices.groupby('listing', sort=False)
+    oldest, newest = listings.first(), listings.last()
+    months = newest['month'] - oldest['month']
+
+    def to_date(month_index):
+        return pd.to_datetime(pd.DataFrame({'year': month_index // 12, 'month': month_index % 12 + 1, 'day': 1})).to_numpy()
+
+    rows = oldest.index.to_numpy()
+    result.iloc[rows, 0] = oldest['price'].to_numpy()
+    result.iloc[rows, 1] = to_date(oldest['month'])
+    result.iloc[rows, 2] = newest['price'].to_numpy()
+    result.iloc[rows, 3] = to_date(newest['month'])
+    result.iloc[rows, 4] = months.to_numpy()
+    # no increase can be worked out from prices of a single month
+    increase = (newest['price'] - oldest['price']) / oldest['price'] * (12 / months.where(months != 0)) * 100
+    result.iloc[rows, 5] = increase.to_numpy()
+    return result
+
+
 def extract_number(value):
     ''''This function extracts the number from a string
     
@@ -1116,4 +1307,199 @@ def extract_first_number(cost):
     if match:
         # Return the matched number as a float after removing any commas
         return float(match.group(0).replace(',', ''))
-    return None
\ No newline at end of file
+    return None
+
+NUMBER_PATTERN = r'(?P<number>\d+)'
+# ways of quoting each rent period and the weeks in it, anything else is taken to be weekly like most listings
+RENT_PERIODS = [
+    (r'p\.?w|per\s+week|/\s*(?:wk|week)|weekly', 1),
+    (r'p\.?c\.?m|p\.?m|per\s+(?:calendar\s+)?month|/\s*(?:mth|month)|monthly', 52 / 12),
+    (r'p\.?f|per\s+fortnight|/\s*fortnight|fortnightly', 2),
+    (r'p\.?a|per\s+(?:annum|year)|/\s*(?:yr|year)|yearly|annually', 52),
+]
+# a price, or a range of prices, and the period right after it, e.g. '$550 - $600 per week' or '$2,400 pcm';
+# the period has to follow the price so '$480 - 12 month lease' is a weekly rent of $480
+AMOUNT = r'\d[\d,]*(?:\.\d+)?'
+RENT_PERIOD_PATTERN = '|'.join(pattern for pattern, _ in RENT_PERIODS)
+RENT_PATTERN = (rf'(?i)\$\s*(?P<low>{AMOUNT})(?:\s*(?:-|–|to)\s*\$\s*(?P<high>{AMOUNT}))?'
+                rf'\s*(?P<period>(?:{RENT_PERIOD_PATTERN})\b)?')
+# for costs without a '$', e.g. '550 - 600 per week'
+BARE_RENT_PATTERN = RENT_PATTERN.replace(r'\$\s*', '')
+
+
+def map_distinct(values, func):
+    '''
+    This function applies an arrow compute function to the distinct strings of a column only,
+    listings repeat values like '2 Beds' so this is much less work than the whole column
+    
+    Parameters:
+    values: series of strings
+    func: function taking and returning an arrow array of the same length
+    
+    Returns:
+    arrow array of func's result for every instance, null where the instance is missing
+    '''
+    text = pa.array(pd.Series(values).astype('str'), type=pa.string())
+    if isinstance(text, pa.ChunkedArray):
+        text = text.combine_chunks()
+    encoded = pc.dictionary_encode(text)
+    return func(encoded.dictionary).take(encoded.indices)
+
+
+def extract_numbers(values):
+    '''
+    This function extracts the number from every instance of a column at once,
+    the column version of extract_number
+    
+    Parameters:
+    values: series of instances that contain the feature and number eg '1 Bed'
+    
+    Returns:
+    series of nullable integers, missing where an instance has no number
+    '''
+    values = pd.Series(values)
+    numbers = map_distinct(values, lambda text: pc.cast(
+        pc.struct_field(pc.extract_regex(text, pattern=NUMBER_PATTERN), 'number'), pa.int64()))
+    return pd.Series(numbers.to_numpy(zero_copy_only=False), index=values.index, dtype='Int64')
+
+
+def extract_rents(costs):
+    '''
+    This function finds the weekly rent of every instance of a column at once, a column
+    version of extract_first_number that also understands how the rent is quoted
+    
+    A range such as '$550 - $600 per week' gives its lower price, like extract_first_number,
+    and monthly, fortnightly and yearly rents such as '$2,400 pcm' are converted to weekly ones.
+    Prices after a '$' are preferred over other numbers in the string, eg the 2 in '2 bed $500'.
+    
+    Parameters:
+    costs: series of strings with rental prices inside
+    
+    Returns:
+    series of nullable floats of the weekly rent, missing where no price is found
+    '''
+    costs = pd.Series(costs)
+
+    def weekly_rent(text):
+        rent = pc.extract_regex(text, pattern=RENT_PATTERN)
+        rent = pc.if_else(pc.is_valid(rent), rent, pc.extract_regex(text, pattern=BARE_RENT_PATTERN))
+        low = pc.cast(pc.replace_substring(pc.struct_field(rent, 'low'), ',', ''), pa.float64())
+        period = pc.struct_field(rent, 'period')
+        weeks = pa.nulls(len(text), pa.float64())
+        for pattern, n in RENT_PERIODS:
+            weeks = pc.if_else(pc.and_(pc.is_null(weeks), pc.match_substring_regex(period, rf'(?i)^(?:{pattern})')),
+                               n, weeks)
+        return pc.round(pc.divide(low, pc.fill_null(weeks, 1.0)), 2)
+
+    weekly = map_distinct(costs, weekly_rent)
+    return pd.Series(weekly.to_numpy(zero_copy_only=False), index=costs.index, dtype='Float64')
+
+
+def extract_listing_numbers(df, counts=('Beds', 'Baths', 'Cars'), cost='Cost'):
+    '''
+    This function cleans the numeric columns of the scraped listings in one go
+    
+    Parameters:
+    df: dataframe of listings
+    counts: columns holding counts such as '2 Beds', cleaned with extract_numbers
+    cost: column holding the rental price, cleaned with extract_rents
+    
+    Returns:
+    copy of df with nullable integer counts and the weekly rent as a nullable float
+    '''
+    df = df.copy()
+    for column in counts:
+        df[column] = extract_numbers(df[column])
+    if cost is not None:
+        df[cost] = extract_rents(df[cost])
+    return df
+
+
+CURATED_RENTAL_FILE = 'data/curated/current_rental_data.csv'
+CHUNK_SIZE = 100_000
+LANDING_COLUMNS = ['Cost', 'Bedrooms', 'Bathrooms', 'Parking', 'Address', 'PropertyType']
+# scrape names to the names of the historical dataset
+RENAMED_COLUMNS = {'Bedrooms': 'Beds', 'Bathrooms': 'Baths', 'Parking': 'Cars', 'PropertyType': 'Property Type'}
+CURATED_COLUMNS = ['Cost', 'Beds', 'Baths', 'Cars', 'Address', 'Property Type', 'Suburb', 'Postcode']
+
+
+def clean_rental_listings(listings):
+    '''
+    This function cleans a chunk of scraped listings: it finds the suburb and postcode of
+    each listing, drops listings outside the suburbs we predict, renames the columns to match
+    the historical dataset, extracts the numbers of Beds, Baths, Cars and the weekly rent
+    and drops listings without Beds or Baths
+    
+    Parameters:
+    listings: dataframe with the LANDING_COLUMNS of scraped listings
+    
+    Returns:
+    cleaned: dataframe with the CURATED_COLUMNS of the listings that are kept
+    unknown: number of listings dropped for being outside the suburbs
+    incomplete: number of listings dropped for missing Beds or Baths
+    '''
+    location = extract_suburb_postcodes(listings['Address'])
+    known = (location['Suburb'] != 'Unknown').to_numpy()
+    listings = listings[known].rename(columns=RENAMED_COLUMNS)
+    listings['Suburb'] = location['Suburb'][known]
+    listings['Postcode'] = location['Postcode'][known]
+
+    # only a missing Cars means no parking, one without a number such as '− Parking' stays missing
+    listings['Cars'] = listings['Cars'].fillna('0')
+    listings = extract_listing_numbers(listings)
+    complete = listings['Beds'].notna() & listings['Baths'].notna()
+    return listings.loc[complete, CURATED_COLUMNS], int((~known).sum()), int((~complete).sum())
+
+
+def curate_rental_scrape(landing=PARQUET_DIR, output_file=CURATED_RENTAL_FILE, chunk_size=CHUNK_SIZE,
+                         crawl_date=None):
+    '''
+    This function runs the whole cleaning of the scraped listings, a chunk at a time from the
+    landing data to the curated CSV, so only one chunk is ever held in memory
+    
+    Parameters:
+    landing: the scrape's Parquet dataset directory, or its CSV file
+    output_file: curated CSV to write, only replaced once every chunk has been written
+    chunk_size: number of listings cleaned at a time
+    crawl_date: ISO date of the crawl to clean, defaults to the latest one, for a Parquet dataset only
+    
+    Returns:
+    dict with the number of listings read, dropped and written
+    '''
+    if os.path.isdir(landing):
+        chunks = iter_scrape(landing, LANDING_COLUMNS, crawl_date, batch_size=chunk_size)
+    else:
+        chunks = pd.read_csv(landing, usecols=LANDING_COLUMNS, chunksize=chunk_size)
+
+    start = time.perf_counter()
+    counts = {'read': 0, 'unknown_suburb': 0, 'missing_beds_baths': 0, 'written': 0}
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(f"{output_file}.tmp", 'w', newline='', encoding='utf-8') as f:
+        pd.DataFrame(columns=CURATED_COLUMNS).to_csv(f)
+        for chunk in chunks:
+            # number the listings through the whole landing data, as reading it at once would
+            chunk.index = pd.RangeIndex(counts['read'], counts['read'] + len(chunk))
+            cleaned, unknown, incomplete = clean_rental_listings(chunk)
+            write_curated(cleaned, f, header=False)
+            counts['read'] += len(chunk)
+            counts['unknown_suburb'] += unknown
+            counts['missing_beds_baths'] += incomplete
+            counts['written'] += len(cleaned)
+    os.replace(f"{output_file}.tmp", output_file)
+
+    print(f"Number of entries labeled as 'Unknown' in the 'Suburb' column: {counts['unknown_suburb']}")
+    print(f"Number of rows removed for missing Beds or Baths: {counts['missing_beds_baths']}")
+    print(f"Wrote {counts['written']} of {counts['read']} listings to {output_file} "
+          f"in {time.perf_counter() - start:.1f}s")
+    return counts
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Clean the scraped listings into the curated rental data")
+    arg_parser.add_argument('--landing', default=PARQUET_DIR,
+                            help="the scrape's Parquet dataset directory or CSV file")
+    arg_parser.add_argument('--output', default=CURATED_RENTAL_FILE)
+    arg_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    arg_parser.add_argument('--crawl-date', default=None, help="ISO date of the crawl, defaults to the latest one")
+    args = arg_parser.parse_args()
+    curate_rental_scrape(args.landing, args.output, args.chunk_size, args.crawl_date)
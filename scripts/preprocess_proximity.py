@@ -2,6 +2,7 @@ import pandas as pd
 import geopandas as gpd
 import numpy as np
 from sklearn.metrics.pairwise import haversine_distances
+from scripts.schema import apply_schema, write_curated
 
 def feat_sf (shapefile, feature_name, feat_type = None, feat_subtypes = None):
     """
@@ -141,6 +142,13 @@ def rental_haversine_closest(rental_df, feature_data, feature_name):
 
     # Add distance  
     rental_df[f'straight_line_distance_{feature_name}'] = nearest_distance
+
+    # Keep the new columns in their curated dtypes, e.g. the names as categories, the
+    # coordinates and distances stay float64 as the table is written out
+    new_columns = [column for column in rental_df.columns if column.startswith(f'nearest_{feature_name}_')]
+    new_columns.append(f'straight_line_distance_{feature_name}')
+    for column, values in apply_schema(rental_df[new_columns], floats=False).items():
+        rental_df[column] = values
     return rental_df
 
 # Calculate the driving route distance using Google Maps API
@@ -204,8 +212,8 @@ def route_dist_and_save_csv(rental_df, feature_name, save_to_dir, gmaps_client,
         
         if (index + 1) % 100 == 0:
             print(f"Processed {index + 1} rows, saving progress...")
-            rental_df.to_csv(f"{save_to_dir}rental_with_{feature_name}.csv", index=False)
+            write_curated(rental_df, f"{save_to_dir}rental_with_{feature_name}.csv", index=False)
             
     # Final save after processing all data
-    rental_df.to_csv(f"{save_to_dir}rental_with_{feature_name}.csv", index=False)
+    write_curated(rental_df, f"{save_to_dir}rental_with_{feature_name}.csv", index=False)
     return rental_df
\ No newline at end of file
@@ -0,0 +1,167 @@
+import re
+import argparse
+import pandas as pd
+
+# dtypes of the columns of the curated rental tables, everything not listed is left as pandas reads it
+CURATED_SCHEMA = {
+    # listings, see preprocess.curate_rental_scrape
+    'Suburb': 'category',
+    'Postcode': 'Int16',  # an integer like the scrape's partitions, so it still merges with other postcodes
+    'Property Type': 'category',
+    'Beds': 'Int8',
+    'Baths': 'Int8',
+    'Cars': 'Int8',
+    'Cost': 'float32',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    # features merged in by SA2 and postcode
+    'SA2 code': 'Int32',
+    'Independent_School_Count': 'Int16',
+    'Non_Independent_School_Count': 'Int16',
+    'parks_count': 'Int16',
+    'shopping_count': 'Int16',
+    'hospital_count': 'Int16',
+    # historical rents, see preprocessing_historical_rent.ipynb
+    'Property_Type': 'category',
+    'Date': 'datetime64[ns]',
+    'Rent': 'float32',
+    'Year': 'Int16',
+    'Month': 'Int8',
+    'Quarter': 'Int8',
+    'Is_Summer': 'Int8',
+    'Is_Autumn': 'Int8',
+    'Is_Winter': 'Int8',
+    'Is_Spring': 'Int8',
+    'Time_Since_Start': 'Int32',
+    'Rent_Lag_1': 'float32',
+    'Rent_Lag_3': 'float32',
+    'Rent_Lag_12': 'float32',
+    'Rent_MA_3': 'float32',
+    'Rent_MA_12': 'float32',
+    'Log_Rent': 'float32',
+}
+
+# columns added for each feature by preprocess_proximity.rental_haversine_closest and route_dist_and_save_csv
+CURATED_PATTERNS = [
+    (re.compile(r'nearest_\w+_(?:name|type)'), 'category'),
+    (re.compile(r'nearest_\w+_(?:latitude|longitude)'), 'float32'),
+    (re.compile(r'(?:straight_line|route)_distance\w*'), 'float32'),
+]
+
+
+def column_dtype(column):
+    """Returns the dtype a curated column is kept in, or None if it has none."""
+    if column in CURATED_SCHEMA:
+        return CURATED_SCHEMA[column]
+    for pattern, dtype in CURATED_PATTERNS:
+        if pattern.fullmatch(column):
+            return dtype
+    return None
+
+
+def curated_dtypes(columns):
+    """Returns the dtype of each of `columns` that has one."""
+    return {column: column_dtype(column) for column in columns if column_dtype(column) is not None}
+
+
+def apply_schema(df, floats=True):
+    """
+    Converts the columns of a curated table to their dtypes.
+
+    Values that don't fit a numeric dtype, e.g. 'Unknown' postcodes, become missing.
+
+    Parameters:
+    df: a curated table.
+    floats: also make the float columns float32. Tables that are about to be written leave
+    them out, so the CSVs keep their full precision.
+
+    Returns:
+    pd.DataFrame: a copy of df with its columns in the dtypes of the schema.
+    """
+    df = df.copy()
+    for column, dtype in curated_dtypes(df.columns).items():
+        if df[column].dtype == dtype or not floats and dtype.startswith('float'):
+            continue
+        if dtype == 'category':
+            df[column] = df[column].astype('category')
+        elif dtype.startswith('datetime'):
+            df[column] = pd.to_datetime(df[column], errors='coerce').astype(dtype)
+        else:
+            numbers = pd.to_numeric(df[column], errors='coerce')
+            if dtype.startswith('Int'):
+                # 2.0 read from a CSV is an integer, 2.5 is not
+                numbers = numbers.where(numbers % 1 == 0)
+            df[column] = numbers.astype(dtype)
+    return df
+
+
+def fill_numeric(df, value=0):
+    """
+    Fills the missing values of every numeric column like df.fillna(value), e.g. the counts of
+    postcodes a merge found nothing for. Categorical columns are left alone, value isn't one of
+    their categories.
+    """
+    return df.fillna({column: value for column in df.select_dtypes('number').columns})
+
+
+def read_curated(path, **kwargs):
+    """
+    Reads a curated CSV straight into the dtypes of the schema.
+
+    Categorical columns are parsed as categories, so the table never holds them as strings.
+
+    Parameters:
+    path: the CSV file.
+    kwargs: passed on to pd.read_csv, e.g. encoding or index_col.
+
+    Returns:
+    pd.DataFrame: the table.
+    """
+    columns = pd.read_csv(path, nrows=0, **{key: value for key, value in kwargs.items() if key != 'dtype'}).columns
+    dtype = {column: 'category' for column, column_type in curated_dtypes(columns).items() if column_type == 'category'}
+    dtype.update(kwargs.pop('dtype', None) or {})
+    return apply_schema(pd.read_csv(path, dtype=dtype, **kwargs))
+
+
+def write_curated(df, path, **kwargs):
+    """
+    Writes a curated table to CSV in the dtypes of the schema, so e.g. counts are written as 2
+    rather than 2.0. Floats are written at full precision, only read_curated makes them float32.
+    """
+    apply_schema(df, floats=False).to_csv(path, **kwargs)
+
+
+def memory_report(before, after=None):
+    """
+    Compares the memory each column of a table takes before and after the schema is applied.
+
+    Parameters:
+    before: the table as read without the schema, e.g. by pd.read_csv.
+    after: the same table in the dtypes of the schema, defaults to apply_schema(before).
+
+    Returns:
+    pd.DataFrame: the dtype and bytes of each column before and after, with a total row.
+    """
+    if after is None:
+        after = apply_schema(before)
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'dtype_after': after.dtypes.astype(str).reindex(before.columns),
+        'bytes_after': after.memory_usage(deep=True, index=False).reindex(before.columns),
+    })
+    report.loc['total'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report['saving'] = (report['bytes_before'] / report['bytes_after']).round(1)
+    print(report.to_string())
+    print(f"{report.loc['total', 'bytes_before'] / 1024 ** 2:.1f} MB before, "
+          f"{report.loc['total', 'bytes_after'] / 1024 ** 2:.1f} MB after, "
+          f"{report.loc['total', 'saving']}x smaller")
+    return report
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Report the memory a curated CSV takes with and without the schema")
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('--encoding', default=None)
+    args = arg_parser.parse_args()
+    memory_report(pd.read_csv(args.path, encoding=args.encoding), read_curated(args.path, encoding=args.encoding))
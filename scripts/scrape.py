@@ -1,13 +1,30 @@
 import re
 import os
-import time
+import argparse
 import random
 import csv
+import email.utils
+import gzip
+import hashlib
+import json
+import math
+import multiprocessing
+import sqlite3
+import time
+import asyncio
+import shutil
+import aiohttp
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from tqdm import tqdm
 from collections import defaultdict
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
+from datetime import datetime, timezone
+from urllib.parse import urlparse
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+from scripts.landing import PARQUET_DIR, ADDRESS_LOCATION_PATTERN
 
 # constants
 BASE_URL = "https://www.domain.com.au"
@@ -1016,59 +1033,899 @@ SUBURBS = ['melbourne-vic-3000',
 
 N_PAGES = range(1, 25)  
 OUTPUT_FILE = 'data/landing/rental_scrape.csv'
+FRONTIER_FILE = 'data/landing/rental_scrape_frontier.sqlite'
+LISTING_INDEX_FILE = 'data/landing/rental_listing_index.sqlite'
+DELTA_FILE = 'data/landing/rental_scrape_delta.csv'
+CACHE_DIR = 'data/landing/http_cache'
+CACHE_TTL = 12 * 60 * 60          # seconds a cached page is used without asking the server
+CACHE_MAX_BYTES = 2 * 1024 ** 3   # compressed size the cache is trimmed back to
+STATS_FILE = 'data/landing/rental_scrape_stats'  # .json summary, .prom textfile and .requests.ndjson log
+STATS_INTERVAL = 30                               # seconds between exports during a run
+CSV_HEADERS = ['URL', 'Name', 'Cost', 'Bedrooms', 'Bathrooms', 'Parking', 'Description', 'Address', 'PropertyType',
+               'Latitude', 'Longitude']
+HEADERS = {'User-Agent': "PostmanRuntime/7.6.0"}
+
+# crawler settings
+N_WORKERS = 8            # requests in flight at once
+PER_HOST_LIMIT = 4       # open (keep-alive) connections to any one host
+REQUESTS_PER_SECOND = 2  # starting rate per host, adapted while the crawl runs
+MIN_REQUESTS_PER_SECOND = 0.2
+MAX_REQUESTS_PER_SECOND = 10
+THROTTLE_STATUSES = (429, 503)
+MAX_THROTTLE_RETRIES = 5
+MAX_INDEX_RETRIES = 3     # attempts at an index page that fails for any other reason
+RESULTS_PER_PAGE = 20    # listings on a full page of search results
+RESULT_COUNT_PATTERN = re.compile(r'(\d[\d,]*)\s+Propert(?:y|ies)', re.IGNORECASE)
 
 
-def fetch_property_links(pages, suburbs):
+class AdaptiveRateLimiter:
     """
-    Fetches URLs of property listings from a specified number of pages.
+    Token bucket rate limiter with a separate budget for each host.
+
+    Each host starts at `rate` requests per second. Every healthy response raises its rate by
+    the share `increase` of itself up to `max_rate`, so a host recovers from a cut just as
+    quickly at 500 requests per second as at 2. A 429 or 503 cuts the rate by `decrease` down
+    to `min_rate` and pauses the host for as long as the server's Retry-After asks (or one
+    request interval if it doesn't say). Throttles answering requests sent before the last
+    cut, or arriving while the host is paused, belong to the same congestion event, so they
+    extend the pause without cutting the rate again.
+    With `per_host=False` every host shares the one budget, and with `increase=0` the rate
+    never goes above its starting value, which makes a fixed ceiling.
+    """
+    def __init__(self, rate, min_rate=MIN_REQUESTS_PER_SECOND, max_rate=MAX_REQUESTS_PER_SECOND,
+                 increase=0.025, decrease=0.5, burst=1, jitter=0.5, per_host=True):
+        self.start_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.jitter = jitter
+        self.per_host = per_host
+        self.hosts = {}
+
+    def bucket(self, url):
+        host = urlparse(url).netloc if self.per_host else None
+        if host not in self.hosts:
+            self.hosts[host] = {'rate': self.start_rate, 'tokens': self.burst,
+                                'updated': time.monotonic(), 'paused_until': 0.0, 'cut_at': 0.0}
+        return self.hosts[host]
+
+    async def wait(self, url):
+        bucket = self.bucket(url)
+        while True:
+            now = time.monotonic()
+            if now < bucket['paused_until']:
+                await asyncio.sleep(bucket['paused_until'] - now)
+                continue
+            bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+            bucket['updated'] = now
+            if bucket['tokens'] >= 1:
+                bucket['tokens'] -= 1
+                return
+            # jitter the wake up so waiting workers don't all retry at once
+            await asyncio.sleep((1 - bucket['tokens']) / bucket['rate'] * (1 + random.uniform(0, self.jitter)))
+
+    def success(self, url):
+        bucket = self.bucket(url)
+        bucket['rate'] = min(self.max_rate, bucket['rate'] * (1 + self.increase))
+
+    def throttled(self, url, retry_after=None, sent_at=None):
+        bucket = self.bucket(url)
+        now = time.monotonic()
+        if now < bucket['paused_until'] or sent_at is not None and sent_at < bucket['cut_at']:
+            # the same congestion event, one cut is enough
+            if retry_after is not None:
+                bucket['paused_until'] = max(bucket['paused_until'], now + retry_after)
+            return
+        bucket['rate'] = max(self.min_rate, bucket['rate'] * self.decrease)
+        bucket['tokens'] = 0
+        bucket['cut_at'] = now
+        pause = retry_after if retry_after is not None else 1 / bucket['rate']
+        bucket['paused_until'] = now + pause
+        print(f"Throttled by {urlparse(url).netloc}: pausing {pause:.1f} seconds, "
+              f"then {bucket['rate']:.2f} requests per second.")
+
+    def rates(self):
+        return {host: round(bucket['rate'], 2) for host, bucket in self.hosts.items()}
+
+
+def parse_retry_after(value):
+    """
+    Reads a Retry-After header, which is either a number of seconds or an HTTP date.
+
+    Returns:
+    float: seconds to wait, or None if the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (email.utils.parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class CrawlFrontier:
+    """
+    Records which index pages and listings a crawl has visited, in a SQLite file next to the
+    output, so an interrupted run can be restarted and only do the work that is left.
+
+    Every URL has a kind ('index' or 'listing') and a status ('pending', 'done' or 'failed').
+    Done index pages keep the links found on them and done listings keep their scraped
+    record, so neither has to be downloaded again.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        # WAL keeps the commit after every page cheap
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                payload TEXT,
+                updated_at REAL
+            )""")
+        self.conn.commit()
+
+    def add(self, urls, kind):
+        """Adds URLs as pending, leaving any that are already known untouched."""
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO frontier (url, kind, status, updated_at) VALUES (?, ?, 'pending', ?)",
+            [(url, kind, time.time()) for url in urls])
+        self.conn.commit()
+
+    def mark(self, url, kind, status, payload=None):
+        """Sets the status of a URL, storing `payload` as JSON when the URL is done."""
+        self.conn.execute("""
+            INSERT INTO frontier (url, kind, status, attempts, payload, updated_at) VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                status = excluded.status, attempts = attempts + 1,
+                payload = excluded.payload, updated_at = excluded.updated_at""",
+            (url, kind, status, json.dumps(payload) if payload is not None else None, time.time()))
+        self.conn.commit()
+
+    def done_payload(self, url):
+        """Returns the stored payload if the URL is done, otherwise None."""
+        row = self.conn.execute(
+            "SELECT payload FROM frontier WHERE url = ? AND status = 'done'", (url,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def is_done(self, url):
+        """Returns whether the URL is done, with or without a stored payload."""
+        return self.conn.execute(
+            "SELECT 1 FROM frontier WHERE url = ? AND status = 'done'", (url,)).fetchone() is not None
+
+    def summary(self):
+        """Returns the number of URLs of each kind in each status."""
+        rows = self.conn.execute("SELECT kind, status, COUNT(*) FROM frontier GROUP BY kind, status")
+        return {(kind, status): count for kind, status, count in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+LISTING_ID_PATTERN = re.compile(r'-(\d+)/?$')
+LISTING_POSTCODE_PATTERN = re.compile(r'vic-\d{4}')
+
+
+def listing_suburb(url, suburbs=SUBURBS):
+    """
+    Returns the slug of the suburb a listing URL is in, e.g. 'footscray-vic-3011' for
+    '.../12-smith-st-footscray-vic-3011-2017000000', so listings are counted under the same
+    suburb as the index pages they were found on. The longest slug wins when several fit,
+    and None is returned if none of `suburbs` does.
+    """
+    path = urlparse(url).path.lower()
+    return max((suburb for suburb in suburbs if f"-{suburb}-" in path), key=len, default=None)
+
+
+class ListingIndex:
+    """
+    Every listing seen by past crawls, kept in SQLite so a refresh only has to scrape the
+    listings that are new or have changed since the last run.
+
+    Each listing keeps its first-seen and last-seen times, a hash of its search result card
+    (from the index pages) and of its scraped record, the record itself and whether it is
+    still 'active' or has been 'delisted'.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS listings (
+                url TEXT PRIMARY KEY,
+                listing_id TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                card_hash TEXT,
+                content_hash TEXT,
+                status TEXT NOT NULL,
+                record TEXT
+            )""")
+        self.conn.commit()
+
+    def diff(self, fingerprints, postcodes):
+        """
+        Compares the listings found by this crawl with the index.
+
+        Parameters:
+        fingerprints: dict of every listing URL found by the crawl to the hash of its result card.
+        postcodes: postcodes whose index pages were all crawled without errors in this run. A
+        listing missing from the crawl only counts as vanished if it is in one of them, so a
+        failed or skipped suburb doesn't delist everything in it.
+
+        Returns:
+        tuple: (new, changed, unchanged, vanished) lists of URLs. New and changed listings need
+        scraping, vanished ones are active in the index but weren't found by the crawl.
+        """
+        known = {url: (card_hash, status) for url, card_hash, status in
+                 self.conn.execute("SELECT url, card_hash, status FROM listings")}
+        new, changed, unchanged = [], [], []
+        for url, card_hash in fingerprints.items():
+            if url not in known:
+                new.append(url)
+            elif known[url][0] != card_hash:
+                changed.append(url)
+            else:
+                unchanged.append(url)
+        vanished = []
+        for url, (_, status) in known.items():
+            if status != 'active' or url in fingerprints:
+                continue
+            postcode = LISTING_POSTCODE_PATTERN.search(url)
+            if postcode and suburb_postcode(postcode.group(0)) in postcodes:
+                vanished.append(url)
+        return new, changed, unchanged, vanished
+
+    def update(self, records, fingerprints, unchanged, vanished, seen_at):
+        """
+        Stores the results of a crawl.
+
+        Parameters:
+        records: the records scraped for new and changed listings.
+        fingerprints: dict of listing URL to the hash of its result card.
+        unchanged: URLs of listings that were seen but not scraped again.
+        vanished: URLs of listings that are no longer on the site.
+        seen_at: time of the crawl as a unix timestamp.
+
+        Returns:
+        list: one (change, record) pair per listing that is new, changed or delisted, where
+        change is 'new', 'changed' or 'delisted'.
+        """
+        changes = []
+        for record in records:
+            url = record['URL']
+            content = {key: value for key, value in record.items() if key != 'URL'}
+            content_hash = hashlib.sha1(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+            row = self.conn.execute("SELECT content_hash FROM listings WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                changes.append(('new', record))
+            elif row[0] != content_hash:
+                changes.append(('changed', record))
+            match = LISTING_ID_PATTERN.search(urlparse(url).path)
+            self.conn.execute("""
+                INSERT INTO listings (url, listing_id, first_seen, last_seen, card_hash, content_hash, status, record)
+                VALUES (?, ?, ?, ?, ?, ?, 'active', ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    last_seen = excluded.last_seen, card_hash = excluded.card_hash,
+                    content_hash = excluded.content_hash, status = 'active', record = excluded.record""",
+                (url, match.group(1) if match else None, seen_at, seen_at, fingerprints.get(url),
+                 content_hash, json.dumps(record)))
+
+        self.conn.executemany("UPDATE listings SET last_seen = ?, status = 'active' WHERE url = ?",
+                              [(seen_at, url) for url in unchanged])
+
+        for url in vanished:
+            row = self.conn.execute("SELECT record FROM listings WHERE url = ?", (url,)).fetchone()
+            self.conn.execute("UPDATE listings SET status = 'delisted' WHERE url = ?", (url,))
+            if row and row[0]:
+                changes.append(('delisted', json.loads(row[0])))
+        self.conn.commit()
+        return changes
+
+    def snapshot(self):
+        """Yields the record of every active listing with its first and last seen dates."""
+        rows = self.conn.execute(
+            "SELECT record, first_seen, last_seen FROM listings WHERE status = 'active' AND record IS NOT NULL")
+        for record, first_seen, last_seen in rows:
+            yield {**json.loads(record), **seen_dates(first_seen, last_seen)}
+
+    def seen_dates(self, url):
+        row = self.conn.execute("SELECT first_seen, last_seen FROM listings WHERE url = ?", (url,)).fetchone()
+        return seen_dates(*row) if row else {}
+
+    def close(self):
+        self.conn.close()
+
+
+def seen_dates(first_seen, last_seen):
+    return {'FirstSeen': time.strftime('%Y-%m-%d', time.localtime(first_seen)),
+            'LastSeen': time.strftime('%Y-%m-%d', time.localtime(last_seen))}
+
+
+class HTTPCache:
+    """
+    On-disk cache of downloaded pages shared by the index and listing crawlers.
+
+    Bodies are stored gzipped next to a small JSON file holding the response's ETag and
+    Last-Modified headers. Pages younger than `ttl` are served straight from disk, older ones
+    are revalidated with a conditional request so unchanged pages cost a 304 instead of a full
+    download. Once the cache grows past `max_bytes` the least recently used pages are evicted.
+    In `offline` mode every page is served from disk and a miss raises a LookupError.
+    """
+    def __init__(self, directory, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, offline=False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits, self.revalidated, self.misses = 0, 0, 0
+
+        # size and last use of every cached body, for eviction
+        self.entries = {}
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.html.gz'):
+                stat = entry.stat()
+                self.entries[entry.name[:-len('.html.gz')]] = (stat.st_size, stat.st_mtime)
+        self.total_bytes = sum(size for size, _ in self.entries.values())
+
+    def paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return key, base + '.html.gz', base + '.json'
+
+    def get(self, url):
+        """Returns (html, metadata) for a cached page, or None if it isn't cached."""
+        key, body_path, meta_path = self.paths(url)
+        if key not in self.entries:
+            return None
+        try:
+            with gzip.open(body_path, 'rt', encoding='utf-8') as f:
+                html = f.read()
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            now = time.time()
+            os.utime(body_path, (now, now))
+        except FileNotFoundError:
+            # evicted by another shard sharing the cache, so it's a miss
+            self.total_bytes -= self.entries.pop(key)[0]
+            return None
+        self.entries[key] = (self.entries[key][0], now)
+        return html, meta
+
+    def is_fresh(self, meta):
+        return time.time() - meta['fetched_at'] < self.ttl
+
+    def conditional_headers(self, meta):
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, url, html, headers):
+        """Saves a page along with the validators from its response headers."""
+        key, body_path, meta_path = self.paths(url)
+        # written aside and renamed so shards sharing the cache never read a half-written page
+        with gzip.open(f"{body_path}.{os.getpid()}", 'wt', encoding='utf-8') as f:
+            f.write(html)
+        os.replace(f"{body_path}.{os.getpid()}", body_path)
+        self.touch(url, headers)
+        size = os.path.getsize(body_path)
+        self.total_bytes += size - self.entries.get(key, (0, 0))[0]
+        self.entries[key] = (size, time.time())
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def touch(self, url, headers, meta=None):
+        """
+        Restarts the TTL of a cached page, e.g. after the server answered 304.
+
+        A 304 may leave out the ETag or Last-Modified, so the validators in `meta`, the page's
+        stored metadata, are kept unless the response sends new ones.
+        """
+        _, _, meta_path = self.paths(url)
+        meta = meta or {}
+        meta = {'url': url, 'etag': headers.get('ETag') or meta.get('etag'),
+                'last_modified': headers.get('Last-Modified') or meta.get('last_modified'),
+                'fetched_at': time.time()}
+        with open(f"{meta_path}.{os.getpid()}", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.{os.getpid()}", meta_path)
+
+    def evict(self):
+        """Removes the least recently used pages until the cache is back under 90% of max_bytes."""
+        for key, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            base = os.path.join(self.directory, key)
+            for path in (base + '.html.gz', base + '.json'):
+                # another shard may have evicted it already
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            del self.entries[key]
+            self.total_bytes -= size
+
+    def summary(self):
+        return (f"{self.hits} cache hits, {self.revalidated} revalidated, {self.misses} downloaded, "
+                f"{len(self.entries)} pages / {self.total_bytes / 1024 ** 2:.1f} MB cached")
+
+
+class CrawlStats:
+    """
+    Per-request telemetry for a crawl.
+
+    Every request is logged to `<path>.requests.ndjson` with the time it spent in each stage
+    (waiting for a pooled connection, DNS, connect, time to first byte, download and parse),
+    its size, status code, retry count and suburb. A summary with p50/p95/p99 of each stage,
+    requests/s and bytes/s is written to `<path>.json` and as a Prometheus textfile to
+    `<path>.prom` every `interval` seconds and at the end of the run.
+    """
+    STAGES = ['queued', 'dns', 'connect', 'ttfb', 'download', 'parse']
+
+    def __init__(self, path, interval=STATS_INTERVAL):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.interval = interval
+        self.started = time.time()
+        self.last_export = self.started
+        self.samples = defaultdict(list)
+        self.requests = defaultdict(int)
+        self.bytes = 0
+        self.retries = 0
+        self.log = open(f"{path}.requests.ndjson", 'a', encoding='utf-8')
+
+    def trace_config(self):
+        """Returns an aiohttp TraceConfig that times the network stages of each request."""
+        def stamp(name):
+            async def callback(session, ctx, params):
+                if isinstance(ctx.trace_request_ctx, dict):
+                    ctx.trace_request_ctx[name] = time.perf_counter()
+            return callback
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(stamp('request_start'))
+        trace_config.on_connection_queued_start.append(stamp('queued_start'))
+        trace_config.on_connection_queued_end.append(stamp('queued_end'))
+        trace_config.on_dns_resolvehost_start.append(stamp('dns_start'))
+        trace_config.on_dns_resolvehost_end.append(stamp('dns_end'))
+        trace_config.on_connection_create_start.append(stamp('connect_start'))
+        trace_config.on_connection_create_end.append(stamp('connect_end'))
+        trace_config.on_request_end.append(stamp('request_end'))
+        return trace_config
+
+    def record(self, kind, url, timing, suburb=None, retries=0):
+        """
+        Adds one request to the telemetry.
+
+        Parameters:
+        kind: 'index' or 'listing'.
+        url: the requested URL.
+        timing: dict filled by fetch_html with timestamps, status, bytes and cache outcome,
+        plus a 'parse' duration in seconds from the caller.
+        suburb: the suburb the page belongs to.
+        retries: number of earlier attempts at this URL.
+        """
+        stages = {}
+        if 'queued_end' in timing:
+            stages['queued'] = timing['queued_end'] - timing['queued_start']
+        if 'dns_end' in timing:
+            stages['dns'] = timing['dns_end'] - timing['dns_start']
+        if 'connect_end' in timing:
+            stages['connect'] = timing['connect_end'] - timing['connect_start'] - stages.get('dns', 0)
+        if 'request_end' in timing:
+            # from having a connection to the response headers arriving
+            connected = timing.get('connect_end', timing.get('queued_end', timing['request_start']))
+            stages['ttfb'] = timing['request_end'] - connected
+        if 'body_end' in timing:
+            stages['download'] = timing['body_end'] - timing['request_end']
+        if 'parse' in timing:
+            stages['parse'] = timing['parse']
+        for stage, seconds in stages.items():
+            self.samples[stage].append(seconds)
+
+        status = timing.get('status', 'error')
+        self.requests[(kind, str(status), timing.get('cache', 'none'))] += 1
+        self.bytes += timing.get('bytes', 0)
+        self.retries += retries
+        self.log.write(json.dumps({
+            'time': time.time(), 'kind': kind, 'url': url, 'suburb': suburb, 'status': status,
+            'cache': timing.get('cache'), 'bytes': timing.get('bytes', 0), 'retries': retries,
+            **{stage: round(seconds, 6) for stage, seconds in stages.items()},
+        }) + '\n')
+
+        if time.time() - self.last_export >= self.interval:
+            self.export()
+
+    def summary(self):
+        """Returns the percentiles of each stage and the throughput of the crawl so far."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        total = sum(self.requests.values())
+        stages = {}
+        for stage in self.STAGES:
+            values = sorted(self.samples[stage])
+            if values:
+                stages[stage] = {
+                    'count': len(values),
+                    'mean': sum(values) / len(values),
+                    **{f'p{q}': values[min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1)] for q in (50, 95, 99)},
+                    'max': values[-1],
+                }
+        return {
+            'elapsed_seconds': elapsed,
+            'requests': total,
+            'requests_per_second': total / elapsed,
+            'bytes': self.bytes,
+            'bytes_per_second': self.bytes / elapsed,
+            'retries': self.retries,
+            'requests_by_kind_status_cache': {'/'.join(key): count for key, count in sorted(self.requests.items())},
+            'stages_seconds': stages,
+        }
+
+    def export(self):
+        """Writes the summary as JSON and as a Prometheus textfile."""
+        summary = self.summary()
+        lines = [
+            '# HELP scrape_requests_total Requests made by the crawler.',
+            '# TYPE scrape_requests_total counter',
+        ]
+        for (kind, status, cache), count in sorted(self.requests.items()):
+            lines.append(f'scrape_requests_total{{kind="{kind}",status="{status}",cache="{cache}"}} {count}')
+        lines += [
+            '# HELP scrape_stage_seconds Time spent in each stage of a request.',
+            '# TYPE scrape_stage_seconds summary',
+        ]
+        for stage, values in summary['stages_seconds'].items():
+            for q in (50, 95, 99):
+                lines.append(f'scrape_stage_seconds{{stage="{stage}",quantile="0.{q}"}} {values[f"p{q}"]:.6f}')
+            lines.append(f'scrape_stage_seconds_sum{{stage="{stage}"}} {values["mean"] * values["count"]:.6f}')
+            lines.append(f'scrape_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        lines += [
+            '# TYPE scrape_bytes_total counter', f'scrape_bytes_total {self.bytes}',
+            '# TYPE scrape_retries_total counter', f'scrape_retries_total {self.retries}',
+            '# TYPE scrape_requests_per_second gauge', f'scrape_requests_per_second {summary["requests_per_second"]:.3f}',
+            '# TYPE scrape_bytes_per_second gauge', f'scrape_bytes_per_second {summary["bytes_per_second"]:.1f}',
+        ]
+
+        # write then rename so readers never see a half written file
+        for suffix, content in (('.json', json.dumps(summary, indent=4)), ('.prom', '\n'.join(lines) + '\n')):
+            with open(self.path + suffix + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(self.path + suffix + '.tmp', self.path + suffix)
+        self.log.flush()
+        self.last_export = time.time()
+
+    def close(self):
+        self.export()
+        self.log.close()
+
+
+def make_session(workers, per_host, timeout, stats=None):
+    """
+    Creates an HTTP session that keeps connections alive and reuses them between requests.
+
+    Parameters:
+    workers: maximum number of open connections in total.
+    per_host: maximum number of open connections to a single host.
+    timeout: total timeout in seconds for a single request.
+    stats: optional CrawlStats that times each request.
+
+    Returns:
+    aiohttp.ClientSession: the pooled session.
+    """
+    connector = aiohttp.TCPConnector(limit=workers, limit_per_host=per_host)
+    return aiohttp.ClientSession(connector=connector, headers=HEADERS,
+                                 timeout=aiohttp.ClientTimeout(total=timeout),
+                                 trace_configs=[stats.trace_config()] if stats else None)
+
+
+async def fetch_html(session, url, limiters, cache=None, timing=None):
+    """
+    Waits for a free slot on the host of `url`, then downloads the page.
+    With a cache, fresh pages are served from disk and stale ones are revalidated.
+
+    Parameters:
+    session: the pooled aiohttp session.
+    url: the page to download.
+    limiters: AdaptiveRateLimiters shared by every worker, each one is waited on in turn and
+    told how the server responded.
+    cache: optional HTTPCache.
+    timing: optional dict that is filled with the stage timestamps, status, size and
+    cache outcome of the request for CrawlStats.
+
+    Returns:
+    str: the page HTML.
+    """
+    timing = {} if timing is None else timing
+    headers = {}
+    cached = cache.get(url) if cache else None
+    if cached:
+        html, meta = cached
+        if cache.offline or cache.is_fresh(meta):
+            cache.hits += 1
+            timing.update(status='cached', cache='hit')
+            return html
+        headers = cache.conditional_headers(meta)
+    elif cache and cache.offline:
+        timing.update(status='cached', cache='miss')
+        raise LookupError(f"{url} is not in the cache")
+
+    for limiter in limiters:
+        await limiter.wait(url)
+    sent_at = time.monotonic()
+    async with session.get(url, headers=headers, trace_request_ctx=timing) as response:
+        timing['status'] = response.status
+        for limiter in limiters:
+            if response.status in THROTTLE_STATUSES:
+                limiter.throttled(url, parse_retry_after(response.headers.get('Retry-After')), sent_at)
+            elif response.status < 400:
+                limiter.success(url)
+        if cached and response.status == 304:
+            cache.revalidated += 1
+            cache.touch(url, response.headers, cached[1])
+            timing.update(cache='revalidated', body_end=time.perf_counter())
+            return cached[0]
+        response.raise_for_status()
+        body = await response.read()
+        timing.update(bytes=len(body), body_end=time.perf_counter())
+        html = body.decode(response.get_encoding(), errors='replace')
+    if cache:
+        cache.misses += 1
+        timing['cache'] = 'miss'
+        cache.store(url, html, response.headers)
+    return html
+
+
+def parse_index_page(html, base_url=BASE_URL):
+    """
+    Extracts the listing URLs and pagination details from a page of search results.
+
+    Parameters:
+    html: the HTML of a search results page.
+    base_url: the site the listing links point to.
+
+    Returns:
+    tuple: (links, total, has_next, fingerprints) where links are the listing URLs on the page
+    in page order, total is the result count shown in the page summary (None if it can't be read),
+    has_next is whether the paginator offers a next page (None if there is no paginator) and
+    fingerprints maps each link to a hash of the text of its result card.
+    """
+    bs_object = BeautifulSoup(html, "lxml")
+
+    results = bs_object.find("ul", {"data-testid": "results"})
+    links = []
+    fingerprints = {}
+    if results:
+        index_links = results.findAll("a", href=re.compile(f"{base_url}/*"))
+        links = [link['href'] for link in index_links if 'address' in link.get('class', [])]
+        # the card shows the price, rooms and headline, so it changes when the listing does
+        for link in index_links:
+            if 'address' in link.get('class', []):
+                card = link.find_parent("li") or link
+                fingerprints[link['href']] = hashlib.sha1(' '.join(card.stripped_strings).encode('utf-8')).hexdigest()
+
+    # e.g. "<strong>48 Properties</strong> for rent in Footscray, VIC 3011"
+    total = None
+    summary = bs_object.find(attrs={"data-testid": "summary"}) or bs_object.find("h1")
+    if summary:
+        match = RESULT_COUNT_PATTERN.search(summary.get_text(" "))
+        if match:
+            total = int(match.group(1).replace(',', ''))
+
+    has_next = None
+    paginator = bs_object.find(attrs={"data-testid": "paginator"})
+    if paginator:
+        has_next = any(
+            'next' in (button.get('aria-label', '') + button.get_text()).lower()
+            and button.get('aria-disabled') != 'true' and not button.has_attr('disabled')
+            for button in paginator.findAll(["a", "button"])
+        )
+
+    return links, total, has_next, fingerprints
+
+
+async def fetch_property_links_async(pages, suburbs, workers=N_WORKERS, per_host=PER_HOST_LIMIT,
+                                     rate=REQUESTS_PER_SECOND, frontier=None, cache=None, fingerprints=None,
+                                     stats=None, limiter=None, base_url=BASE_URL, completed=None):
+    """
+    Fetches URLs of property listings with a pool of concurrent workers.
+
+    Each suburb starts at its first page. The result count (or the paginator's next page
+    marker) on that page decides how many more pages are requested, and a suburb stops
+    as soon as one of its pages comes back without listings. Index pages already done in
+    `frontier` are replayed from it instead of being downloaded again.
 
     Parameters:
     pages: a range of pages to scrape for property links.
     suburbs: list of suburbs to search for property listings.
+    workers: number of pages fetched at the same time.
+    per_host: maximum number of open connections to domain.com.au.
+    rate: maximum number of requests per second sent to domain.com.au.
+    frontier: optional CrawlFrontier that records the progress of the crawl.
+    cache: optional HTTPCache for the downloaded pages.
+    fingerprints: optional dict that is filled with a hash of each listing's result card.
+    stats: optional CrawlStats that records the telemetry of each request.
+    limiter: optional AdaptiveRateLimiter to share with other crawls, one starting at `rate`
+    is made if not given.
+    base_url: the site to crawl, e.g. a local mock server in benchmarks.
+    completed: optional set that is filled with the suburbs whose index pages were all
+    crawled without errors.
 
     Returns:
-    list: A list of URLs pointing to individual property listings.
+    list: A list of URLs pointing to individual property listings, in the same order
+    as a sequential crawl of `suburbs` x `pages`.
     """
     print("Starting to fetch property links...")
-    url_links = []
-    
-    for suburb in suburbs:
-        for page in pages:
-            url = BASE_URL + f"/rent/{suburb}/?page={page}"
-            print(f"Visiting {url}")
-            
+    pages = list(pages)
+    jobs = asyncio.Queue()
+
+    def index_url(suburb_idx, page):
+        return base_url + f"/rent/{suburbs[suburb_idx]}/?page={page}"
+
+    def queue_pages(suburb_idx, new_pages):
+        for page in new_pages:
+            jobs.put_nowait((suburb_idx, page, index_url(suburb_idx, page)))
+
+    if pages:
+        for suburb_idx in range(len(suburbs)):
+            queue_pages(suburb_idx, pages[:1])
+
+    # links found on each (suburb, page), so the result can be put back in crawl order
+    found = {}
+    # suburbs that have run out of listings
+    exhausted = set()
+    # suburbs whose pages were all queued from the result count on the first of their pages that came back
+    counted = set()
+    # suburbs with a page that failed for good
+    failed = set()
+    requested, replayed = 0, 0
+    limiter = limiter or AdaptiveRateLimiter(rate)
+    throttle_retries = defaultdict(int)
+    error_retries = defaultdict(int)
+
+    async def worker(session):
+        nonlocal requested, replayed
+        while True:
+            suburb_idx, page, url = await jobs.get()
+            timing = None
             try:
-                print("Sending request to server...")
-                bs_object = BeautifulSoup(urlopen(Request(url, headers={'User-Agent': "PostmanRuntime/7.6.0"}), timeout=100), "lxml")
-                print("Successfully received response.")
-                
-                index_links = bs_object.find("ul", {"data-testid": "results"}).findAll(
-                    "a", href=re.compile(f"{BASE_URL}/*")
-                )
-                
-                for link in index_links:
-                    if 'address' in link.get('class', []):
-                        url_links.append(link['href'])
-                        print(f"Found link: {link['href']}")
-
-            except HTTPError as e:
-                print(f"HTTP Error: {e.code} - {e.reason} for {url}. Moving to the next suburb.")
-                continue
-            except URLError as e:
-                print(f"URL Error: {e.reason} for {url}. Moving to the next suburb.")
-                continue
+                if suburb_idx in exhausted:
+                    continue
+                done = frontier.done_payload(url) if frontier else None
+                if done is not None:
+                    links, total, has_next = done['links'], done['total'], done['has_next']
+                    page_fingerprints = done.get('fingerprints', {})
+                    replayed += 1
+                else:
+                    print(f"Visiting {url}")
+                    requested += 1
+                    timing = {}
+                    html = await fetch_html(session, url, [limiter], cache, timing)
+                    parse_start = time.perf_counter()
+                    links, total, has_next, page_fingerprints = parse_index_page(html, base_url)
+                    timing['parse'] = time.perf_counter() - parse_start
+                    if stats:
+                        stats.record('index', url, timing, suburbs[suburb_idx],
+                                     error_retries[url] + throttle_retries[url])
+                    if frontier:
+                        frontier.mark(url, 'index', 'done', {'links': links, 'total': total, 'has_next': has_next,
+                                                             'fingerprints': page_fingerprints})
+                if fingerprints is not None:
+                    fingerprints.update(page_fingerprints)
+                found[(suburb_idx, page)] = links
+                for link in links:
+                    print(f"Found link: {link}")
+
+                later_pages = [p for p in pages if p > page]
+                if not links:
+                    print(f"No listings on {url}. Moving to the next suburb.")
+                    exhausted.add(suburb_idx)
+                elif suburb_idx not in counted and total is not None:
+                    # the whole page range is known from the first page that came back, usually
+                    # page 1, fetch the rest of it at once
+                    last_page = math.ceil(total / RESULTS_PER_PAGE)
+                    counted.add(suburb_idx)
+                    queue_pages(suburb_idx, [p for p in later_pages if p <= last_page])
+                elif total is None and has_next is not False:
+                    queue_pages(suburb_idx, later_pages[:1])
             except Exception as e:
-                print(f"Error fetching {url}: {e}. Moving to the next suburb.")
-                continue
-            
-            # Add random delay between requests
-            delay = random.uniform(1, 2)
-            print(f"Delaying for {delay:.2f} seconds...")
-            time.sleep(delay)
-    
+                if frontier:
+                    frontier.mark(url, 'index', 'failed')
+                if stats and timing is not None and 'parse' not in timing:
+                    stats.record('index', url, timing, suburbs[suburb_idx],
+                                 error_retries[url] + throttle_retries[url])
+                if isinstance(e, aiohttp.ClientResponseError):
+                    message = f"HTTP Error: {e.status} - {e.message} for {url}."
+                elif isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    message = f"URL Error: {e!r} for {url}."
+                else:
+                    message = f"Error fetching {url}: {e}."
+                throttled = isinstance(e, aiohttp.ClientResponseError) and e.status in THROTTLE_STATUSES
+                if isinstance(e, aiohttp.ClientResponseError) and e.status == 404 or isinstance(e, LookupError):
+                    print(f"{message} Moving to the next suburb.")
+                    exhausted.add(suburb_idx)
+                    failed.add(suburb_idx)
+                elif throttled and throttle_retries[url] < MAX_THROTTLE_RETRIES:
+                    # the limiter has already paused the host, so the page just goes back in the queue
+                    throttle_retries[url] += 1
+                    print(f"{message} Retrying once the server allows it.")
+                    jobs.put_nowait((suburb_idx, page, url))
+                elif not throttled and error_retries[url] < MAX_INDEX_RETRIES - 1:
+                    error_retries[url] += 1
+                    print(f"{message} Retrying (attempt {error_retries[url] + 1}/{MAX_INDEX_RETRIES}).")
+                    jobs.put_nowait((suburb_idx, page, url))
+                elif suburb_idx in counted:
+                    # the later pages are already queued
+                    print(f"{message} Giving up on this page.")
+                    failed.add(suburb_idx)
+                else:
+                    print(f"{message} Moving to the next page.")
+                    failed.add(suburb_idx)
+                    queue_pages(suburb_idx, [p for p in pages if p > page][:1])
+            finally:
+                jobs.task_done()
+
+    async with make_session(workers, per_host, timeout=100, stats=stats) as session:
+        tasks = [asyncio.create_task(worker(session)) for _ in range(workers)]
+        try:
+            await jobs.join()
+        finally:
+            # also when the crawl itself is cancelled, e.g. by a timeout, so no worker outlives the session
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    url_links = [link for key in sorted(found) for link in found[key]]
+    if completed is not None and pages:
+        completed.update(suburb for suburb_idx, suburb in enumerate(suburbs) if suburb_idx not in failed)
+    fixed = len(pages) * len(suburbs)
+    print(f"Request rates per host at the end of the crawl: {limiter.rates()}")
+    print(f"Requested {requested} index pages instead of {fixed} "
+          f"({fixed - requested - replayed} saved by stopping early, {replayed} replayed from the frontier).")
     print("Finished fetching property links.")
     return url_links
 
+
+def fetch_property_links(pages, suburbs, workers=N_WORKERS, per_host=PER_HOST_LIMIT, rate=REQUESTS_PER_SECOND,
+                         frontier=None, cache=None, fingerprints=None, stats=None, limiter=None, base_url=BASE_URL,
+                         completed=None):
+    """
+    Fetches URLs of property listings from a specified number of pages.
+    Runs `fetch_property_links_async` to completion; `workers=1` with `rate=0.67`
+    reproduces the old one-page-at-a-time crawl.
+
+    Parameters:
+    pages: a range of pages to scrape for property links.
+    suburbs: list of suburbs to search for property listings.
+    workers: number of pages fetched at the same time.
+    per_host: maximum number of open connections to domain.com.au.
+    rate: maximum number of requests per second sent to domain.com.au.
+    frontier: optional CrawlFrontier that records the progress of the crawl.
+    cache: optional HTTPCache for the downloaded pages.
+    fingerprints: optional dict that is filled with a hash of each listing's result card.
+    stats: optional CrawlStats that records the telemetry of each request.
+    limiter: optional AdaptiveRateLimiter to share with other crawls.
+    base_url: the site to crawl, e.g. a local mock server in benchmarks.
+    completed: optional set that is filled with the suburbs whose index pages were all
+    crawled without errors.
+
+    Returns:
+    list: A list of URLs pointing to individual property listings.
+    """
+    return asyncio.run(fetch_property_links_async(pages, suburbs, workers, per_host, rate, frontier, cache,
+                                                  fingerprints, stats, limiter, base_url, completed))
+
 def get_unique_urls(url_list):
     """
     Filters out duplicate URLs from the list.
@@ -1083,74 +1940,441 @@ def get_unique_urls(url_list):
     print(f"Filtered unique URLs. Original count: {len(url_list)}, Unique count: {len(url_list)}")
     return url_list
 
-def scrape_property_data(url_links):
+def parse_property_page_soup(html, property_url):
     """
-    Scrapes basic metadata from each property listing page.
+    Extracts the basic metadata from the HTML of a property listing page with BeautifulSoup.
+    This is the reference implementation that `parse_property_page_css` is benchmarked against.
+
+    Parameters:
+    html: the HTML of the listing page.
+    property_url: the URL the page was downloaded from.
+
+    Returns:
+    dict: the scraped metadata of the property.
+    """
+    bs_object = BeautifulSoup(html, "lxml")
+
+    # Extract property details
+    address = bs_object.find("h1", {"class": "css-164r41r"}).text if bs_object.find("h1", {"class": "css-164r41r"}) else 'N/A'
+    cost_text = bs_object.find("div", {"data-testid": "listing-details__summary-title"}).text if bs_object.find("div", {"data-testid": "listing-details__summary-title"}) else 'N/A'
+    rooms = bs_object.find("div", {"data-testid": "property-features"}).findAll("span", {"data-testid": "property-features-text-container"})
+    bed_info = [re.findall(r'\d+\s[A-Za-z]+', feature.text)[0] for feature in rooms if 'Bed' in feature.text]
+    bath_info = [re.findall(r'\d+\s[A-Za-z]+', feature.text)[0] for feature in rooms if 'Bath' in feature.text]
+    parking_info = [re.findall(r'\S+\s[A-Za-z]+', feature.text)[0] for feature in rooms if 'Parking' in feature.text]
+    desc_element = bs_object.find("p")
+    desc = re.sub(r'<br\/>', '\n', str(desc_element)).strip('</p>') if desc_element else 'N/A'
+    headline_element = bs_object.find(attrs={"data-testid": "listing-details__description-headline"})
+    name = headline_element.text.strip() if headline_element else 'N/A'
+    property_type_element = bs_object.find("div", {"data-testid":"listing-summary-property-type"})
+    property_type = property_type_element.find("span").text.strip() if property_type_element else 'N/A'
+
+    # Collect data
+    return {
+        'URL': property_url,
+        'Name': name,
+        'Address': address,
+        'Cost': cost_text,
+        'Bedrooms': ', '.join(bed_info),
+        'Bathrooms': ', '.join(bath_info),
+        'Parking': ', '.join(parking_info),
+        'Description': desc,
+        'PropertyType': property_type
+    }
+
+
+def has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Every node parse_property_page_css needs, found with one compiled query in document order
+LISTING_NODES = etree.XPath(
+    f'//h1[{has_class("css-164r41r")}]'
+    ' | //div[@data-testid="listing-details__summary-title"]'
+    ' | //div[@data-testid="property-features"]'
+    ' | (//p)[1]'
+    ' | //*[@data-testid="listing-details__description-headline"]'
+    ' | //div[@data-testid="listing-summary-property-type"]'
+)
+FEATURE_SPANS = etree.XPath('.//span[@data-testid="property-features-text-container"]')
+FIRST_SPAN = etree.XPath('(.//span)[1]')
+ROOM_PATTERN = re.compile(r'\d+\s[A-Za-z]+')
+PARKING_PATTERN = re.compile(r'\S+\s[A-Za-z]+')
+LINE_BREAK_PATTERN = re.compile(r'<br\/>')
+
+
+def parse_property_page_css(html, property_url):
+    """
+    Extracts the basic metadata from the HTML of a property listing page using its CSS classes
+    and test ids.
+
+    Gives the same record as `parse_property_page_soup`, but collects all the nodes it needs
+    with a single XPath query over the lxml tree instead of repeated BeautifulSoup searches.
+    A page without a features block gives empty Bedrooms/Bathrooms/Parking instead of failing.
+
+    Parameters:
+    html: the HTML of the listing page.
+    property_url: the URL the page was downloaded from.
+
+    Returns:
+    dict: the scraped metadata of the property.
+    """
+    tree = lxml.html.document_fromstring(html)
+
+    # keep the first node of each kind, the same one BeautifulSoup's find() would return
+    nodes = {}
+    for node in LISTING_NODES(tree):
+        if node.tag == 'p':
+            kind = 'p'
+        elif node.tag == 'h1' and 'css-164r41r' in node.get('class', '').split():
+            kind = 'address'
+        else:
+            kind = node.get('data-testid')
+        nodes.setdefault(kind, node)
+
+    address = nodes['address'].text_content() if 'address' in nodes else 'N/A'
+    cost_text = nodes['listing-details__summary-title'].text_content() if 'listing-details__summary-title' in nodes else 'N/A'
+
+    bed_info, bath_info, parking_info = [], [], []
+    if 'property-features' in nodes:
+        for feature in FEATURE_SPANS(nodes['property-features']):
+            text = feature.text_content()
+            if 'Bed' in text:
+                bed_info.append(ROOM_PATTERN.findall(text)[0])
+            if 'Bath' in text:
+                bath_info.append(ROOM_PATTERN.findall(text)[0])
+            if 'Parking' in text:
+                parking_info.append(PARKING_PATTERN.findall(text)[0])
+
+    if 'p' in nodes:
+        desc_html = etree.tostring(nodes['p'], encoding='unicode', method='xml', with_tail=False)
+        desc = LINE_BREAK_PATTERN.sub('\n', desc_html).strip('</p>')
+    else:
+        desc = 'N/A'
+    headline = nodes.get('listing-details__description-headline')
+    name = headline.text_content().strip() if headline is not None else 'N/A'
+    type_spans = FIRST_SPAN(nodes['listing-summary-property-type']) if 'listing-summary-property-type' in nodes else []
+    property_type = type_spans[0].text_content().strip() if type_spans else 'N/A'
+
+    return {
+        'URL': property_url,
+        'Name': name,
+        'Address': address,
+        'Cost': cost_text,
+        'Bedrooms': ', '.join(bed_info),
+        'Bathrooms': ', '.join(bath_info),
+        'Parking': ', '.join(parking_info),
+        'Description': desc,
+        'PropertyType': property_type
+    }
+
+
+NEXT_DATA_PATTERN = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+
+
+def find_listing_props(page_state):
+    """
+    Finds the part of a page's embedded state that describes the listing.
+
+    Parameters:
+    page_state: the decoded __NEXT_DATA__ JSON of a listing page.
+
+    Returns:
+    dict: the listing's properties, or None if the state has no listing in it.
+    """
+    props = page_state.get('props', {}).get('pageProps', {}).get('componentProps')
+    if isinstance(props, dict) and 'listingId' in props:
+        return props
+
+    # the layout of the state changes between site releases, so fall back to searching for it
+    stack = [page_state]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if 'listingId' in item and ('beds' in item or 'listingSummary' in item):
+                return item
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return None
+
+
+def first_value(*values):
+    return next((value for value in values if value not in (None, '', [])), None)
+
+
+def count_label(count, singular, plural):
+    if count is None:
+        return None
+    return f"{count} {singular if count == 1 else plural}"
+
+
+def parse_property_page_json(html, property_url):
+    """
+    Extracts the metadata of a listing from the JSON state domain.com.au embeds in each page.
+
+    Only the __NEXT_DATA__ script is decoded, no HTML tree is built. The state also carries the
+    listing's coordinates, so these records don't need geocoding later.
+
+    Parameters:
+    html: the HTML of the listing page.
+    property_url: the URL the page was downloaded from.
+
+    Returns:
+    dict: the scraped metadata of the property with 'N/A' for fields the state doesn't have,
+    or None if the page has no listing state at all.
+    """
+    match = NEXT_DATA_PATTERN.search(html)
+    if not match:
+        return None
+    try:
+        props = find_listing_props(json.loads(match.group(1)))
+    except ValueError:
+        return None
+    if props is None:
+        return None
+
+    summary = props.get('listingSummary') or {}
+    location = props.get('map') or props.get('geoLocation') or {}
+
+    address = first_value(summary.get('address'), props.get('address'))
+    if address is None and props.get('street'):
+        address = f"{props['street']}, {props.get('suburb', '')} {props.get('state', 'VIC')} {props.get('postcode', '')}".strip()
+    description = props.get('description')
+    if isinstance(description, list):
+        description = '\n'.join(description)
+
+    record = {
+        'URL': property_url,
+        'Name': first_value(props.get('headline')),
+        'Address': address,
+        'Cost': first_value(summary.get('title'), props.get('price'), (props.get('priceDetails') or {}).get('displayPrice')),
+        'Bedrooms': count_label(first_value(summary.get('beds'), props.get('beds')), 'Bed', 'Beds'),
+        'Bathrooms': count_label(first_value(summary.get('baths'), props.get('baths')), 'Bath', 'Baths'),
+        'Parking': count_label(first_value(summary.get('parking'), props.get('parking')), 'Parking', 'Parking'),
+        'Description': first_value(description),
+        'PropertyType': first_value(summary.get('propertyType'), props.get('propertyType')),
+        'Latitude': first_value(location.get('latitude'), props.get('latitude')),
+        'Longitude': first_value(location.get('longitude'), props.get('longitude')),
+    }
+    return {key: 'N/A' if value is None else value for key, value in record.items()}
+
+
+def parse_property_page(html, property_url):
+    """
+    Extracts the basic metadata from the HTML of a property listing page.
+
+    Reads the page's embedded JSON state first and only falls back to the CSS-selector parser
+    for the page, or for the fields, that the state doesn't cover.
+
+    Parameters:
+    html: the HTML of the listing page.
+    property_url: the URL the page was downloaded from.
+
+    Returns:
+    dict: the scraped metadata of the property.
+    """
+    record = parse_property_page_json(html, property_url)
+    if record is None:
+        return parse_property_page_css(html, property_url)
+
+    missing = [key for key, value in record.items() if value == 'N/A' and key not in ('Latitude', 'Longitude')]
+    if missing:
+        css_record = parse_property_page_css(html, property_url)
+        for key in missing:
+            record[key] = css_record[key]
+    return record
+
+
+async def scrape_property_data_async(url_links, workers=N_WORKERS, per_host=PER_HOST_LIMIT,
+                                     rate=REQUESTS_PER_SECOND, max_rps=None, max_retries=3, timeout=303,
+                                     frontier=None, sink=None, cache=None, stats=None, limiter=None):
+    """
+    Scrapes basic metadata from each property listing page with a pool of concurrent workers.
+
+    A failed page is put back on the queue after an exponential backoff instead of the
+    worker sleeping on it, so one slow or broken listing never holds up the others.
+    Listings already done in `frontier` are taken from it instead of being scraped again.
+
+    With a `sink`, each record is written to it as soon as it is parsed and nothing is kept in
+    memory. Listings are only marked done in `frontier` once the sink has synced them to disk,
+    and listings already in the sink's file are skipped.
 
     Parameters:
     url_links: a list of URLs pointing to individual property listings.
+    workers: number of listings scraped at the same time.
+    per_host: maximum number of open connections to domain.com.au.
+    rate: maximum number of requests per second sent to any one host.
+    max_rps: optional ceiling on requests per second across all hosts.
+    max_retries: attempts per listing before it is given up on.
+    timeout: total timeout in seconds for a single request.
+    frontier: optional CrawlFrontier that records the progress of the crawl.
+    sink: optional CSVSink that scraped records are streamed into.
+    cache: optional HTTPCache for the downloaded pages.
+    stats: optional CrawlStats that records the telemetry of each request.
+    limiter: optional AdaptiveRateLimiter to share with other crawls, one starting at `rate`
+    is made if not given.
 
     Returns:
-    defaultdict: a dictionary containing scraped metadata for each property.
+    list: the scraped metadata of each listing, in the same order as `url_links`.
+    With a sink, the number of records written to it instead.
     """
     print("Starting to scrape property data...")
-    all_properties = []
+    loop = asyncio.get_running_loop()
+    jobs = asyncio.Queue()
+    scraped = {}
+    skipped = 0
+    if frontier:
+        frontier.add(url_links, 'listing')
+    for idx, property_url in enumerate(url_links):
+        if sink is not None:
+            if property_url in sink.written_urls or (frontier and frontier.is_done(property_url)):
+                skipped += 1
+                continue
+            record = None
+        else:
+            record = frontier.done_payload(property_url) if frontier else None
+        if record is not None:
+            scraped[idx] = record
+            skipped += 1
+        else:
+            jobs.put_nowait((idx, property_url, 0))
+    if skipped:
+        print(f"Skipping {skipped} listings already scraped in a previous run.")
+
+    # listings written to the sink but not yet synced to disk
+    unsynced = []
+    written = 0
+
+    def checkpoint():
+        sink.checkpoint()
+        if frontier:
+            for synced_url in unsynced:
+                frontier.mark(synced_url, 'listing', 'done')
+        unsynced.clear()
+
+    remaining = jobs.qsize()
+    finished = asyncio.Event()
+    if not remaining:
+        finished.set()
+    limiters = [limiter or AdaptiveRateLimiter(rate)]
+    if max_rps:
+        limiters.append(AdaptiveRateLimiter(max_rps, increase=0, per_host=False))
+
     success_count, total_count = 0, 0
-    pbar = tqdm(url_links)
-    for property_url in pbar:
-        retry_count = 0
-        max_retries = 3
-        backoff_time = 1  
-    
-        while retry_count < max_retries:
+    # 429s and 503s are retried on their own budget, they don't use up the listing's attempts
+    throttle_retries = defaultdict(int)
+    # retries waiting out their backoff
+    retry_handles = []
+    pbar = tqdm(total=remaining)
+
+    def settle(success):
+        nonlocal remaining, success_count, total_count
+        remaining -= 1
+        total_count += 1
+        success_count += success
+        pbar.update(1)
+        pbar.set_description(f"{(success_count/total_count * 100):.0f}% successful")
+        if remaining == 0:
+            finished.set()
+
+    async def worker(session):
+        nonlocal written
+        while True:
+            idx, property_url, retry_count = await jobs.get()
             print(f"Scraping {property_url} (Attempt {retry_count + 1}/{max_retries})")
+            timing = {}
+            suburb = listing_suburb(property_url)
             try:
-                bs_object = BeautifulSoup(urlopen(Request(property_url, headers={'User-Agent': "PostmanRuntime/7.6.0"}), timeout=303), "lxml")
-                total_count += 1
-
-                # Extract property details
-                address = bs_object.find("h1", {"class": "css-164r41r"}).text if bs_object.find("h1", {"class": "css-164r41r"}) else 'N/A'
-                cost_text = bs_object.find("div", {"data-testid": "listing-details__summary-title"}).text if bs_object.find("div", {"data-testid": "listing-details__summary-title"}) else 'N/A'
-                rooms = bs_object.find("div", {"data-testid": "property-features"}).findAll("span", {"data-testid": "property-features-text-container"})
-                bed_info = [re.findall(r'\d+\s[A-Za-z]+', feature.text)[0] for feature in rooms if 'Bed' in feature.text]
-                bath_info = [re.findall(r'\d+\s[A-Za-z]+', feature.text)[0] for feature in rooms if 'Bath' in feature.text]
-                parking_info = [re.findall(r'\S+\s[A-Za-z]+', feature.text)[0] for feature in rooms if 'Parking' in feature.text]
-                desc_element = bs_object.find("p")
-                desc = re.sub(r'<br\/>', '\n', str(desc_element)).strip('</p>') if desc_element else 'N/A'
-                property_type_element = bs_object.find("div", {"data-testid":"listing-summary-property-type"})
-                property_type = property_type_element.find("span").text.strip() if property_type_element else 'N/A'
-
-                # Collect data
-                # Collect data
-                all_properties.append({
-                    'URL': property_url,
-                    'Address': address,
-                    'Cost': cost_text,
-                    'Bedrooms': ', '.join(bed_info),
-                    'Bathrooms': ', '.join(bath_info),
-                    'Parking': ', '.join(parking_info),
-                    'Description': desc,
-                    'Address': address,
-                    'PropertyType': property_type
-                })
-
+                html = await fetch_html(session, property_url, limiters, cache, timing)
+                parse_start = time.perf_counter()
+                record = parse_property_page(html, property_url)
+                timing['parse'] = time.perf_counter() - parse_start
+                if stats:
+                    stats.record('listing', property_url, timing, suburb, retry_count)
+                if sink is not None:
+                    sink.write(record)
+                    unsynced.append(property_url)
+                    written += 1
+                    if len(unsynced) >= sink.checkpoint_every:
+                        checkpoint()
+                else:
+                    scraped[idx] = record
+                    if frontier:
+                        frontier.mark(property_url, 'listing', 'done', record)
                 print(f"Successfully scraped data for {property_url}")
-                success_count += 1
-                break   
+                settle(True)
             except Exception as e:
-                print(f"Issue with {property_url}: {e}")
+                print(f"Issue with {property_url}: {e or repr(e)}")
+                if stats and 'parse' not in timing:
+                    stats.record('listing', property_url, timing, suburb, retry_count)
+                throttled = isinstance(e, aiohttp.ClientResponseError) and e.status in THROTTLE_STATUSES
+                if throttled and throttle_retries[idx] < MAX_THROTTLE_RETRIES:
+                    # the limiter has already paused the host for as long as the server asked
+                    throttle_retries[idx] += 1
+                    print(f"Retrying {property_url} once the server allows it...")
+                    jobs.put_nowait((idx, property_url, retry_count))
+                    continue
                 retry_count += 1
-                if retry_count < max_retries:
-                    print(f"Retrying in {backoff_time} seconds...")
-                    time.sleep(backoff_time)  
-                    backoff_time *= 2  # backing off on retry
+                # a page missing from an offline cache won't turn up on a retry
+                if retry_count < max_retries and not isinstance(e, LookupError):
+                    backoff_time = 2 ** (retry_count - 1)
+                    print(f"Retrying {property_url} in {backoff_time} seconds...")
+                    retry_handles.append(loop.call_later(backoff_time, jobs.put_nowait, (idx, property_url, retry_count)))
                 else:
                     print(f"Failed to scrape {property_url} after {max_retries} attempts.")
-                    
-        pbar.set_description(f"{(success_count/total_count * 100):.0f}% successful")
-    
+                    if frontier:
+                        frontier.mark(property_url, 'listing', 'failed')
+                    settle(False)
+
+    async with make_session(workers, per_host, timeout, stats) as session:
+        tasks = [asyncio.create_task(worker(session)) for _ in range(workers)]
+        try:
+            await finished.wait()
+        finally:
+            # also when the crawl itself is cancelled, e.g. by a timeout, so no worker or pending
+            # retry outlives the session
+            for handle in retry_handles:
+                handle.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            pbar.close()
+
+    print(f"Request rates per host at the end of the crawl: {limiters[0].rates()}")
     print("Finished scraping property data.")
-    return all_properties
+    if sink is not None:
+        checkpoint()
+        return written
+    return [scraped[idx] for idx in sorted(scraped)]
+
+
+def scrape_property_data(url_links, workers=N_WORKERS, per_host=PER_HOST_LIMIT, rate=REQUESTS_PER_SECOND,
+                         max_rps=None, max_retries=3, frontier=None, sink=None, cache=None, stats=None,
+                         limiter=None):
+    """
+    Scrapes basic metadata from each property listing page.
+    Runs `scrape_property_data_async` to completion.
+
+    Parameters:
+    url_links: a list of URLs pointing to individual property listings.
+    workers: number of listings scraped at the same time.
+    per_host: maximum number of open connections to domain.com.au.
+    rate: maximum number of requests per second sent to any one host.
+    max_rps: optional ceiling on requests per second across all hosts.
+    max_retries: attempts per listing before it is given up on.
+    frontier: optional CrawlFrontier that records the progress of the crawl.
+    sink: optional CSVSink that scraped records are streamed into.
+    cache: optional HTTPCache for the downloaded pages.
+    stats: optional CrawlStats that records the telemetry of each request.
+    limiter: optional AdaptiveRateLimiter to share with other crawls.
+
+    Returns:
+    list: a list of dictionaries containing scraped metadata for each property,
+    or the number of records written when a sink is given.
+    """
+    return asyncio.run(scrape_property_data_async(url_links, workers, per_host, rate, max_rps, max_retries,
+                                                  frontier=frontier, sink=sink, cache=cache, stats=stats,
+                                                  limiter=limiter))
 
 
 def save_data(data, output_file):
@@ -1165,11 +2389,8 @@ def save_data(data, output_file):
         print(f"Saving data to {output_file}...")
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         
-        # Define CSV headers
-        headers = ['URL', 'Name', 'Cost', 'Bedrooms', 'Bathrooms', 'Parking', 'Description', 'Address', 'PropertyType']
-
         with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
+            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
             writer.writeheader()
             writer.writerows(data)
 
@@ -1178,11 +2399,319 @@ def save_data(data, output_file):
     except Exception as e:
         print(f"An error occurred while saving data: {e}")
 
+
+def incremental_crawl(index, pages=N_PAGES, suburbs=SUBURBS, frontier=None, cache=None, stats=None, limiter=None):
+    """
+    Refreshes the listing index, only scraping listings that are new or whose search result
+    card has changed since the last run, and marking listings that have disappeared as delisted.
+
+    Writes the new, changed and delisted listings to DELTA_FILE and a merged snapshot of every
+    active listing to OUTPUT_FILE, both with the dates each listing was first and last seen.
+
+    Parameters:
+    index: the ListingIndex from previous runs.
+    pages: a range of pages to scrape for property links.
+    suburbs: list of suburbs to search for property listings.
+    frontier: optional CrawlFrontier that records the progress of the crawl.
+    cache: optional HTTPCache for the downloaded pages.
+    stats: optional CrawlStats that records the telemetry of each request.
+    limiter: optional AdaptiveRateLimiter shared by the index and listing crawls.
+    """
+    seen_at = time.time()
+    fingerprints = {}
+    completed = set()
+    fetch_property_links(pages, suburbs, frontier=frontier, cache=cache, fingerprints=fingerprints, stats=stats,
+                         limiter=limiter, completed=completed)
+    # a postcode shared by a failed suburb can't tell which of its listings are really gone
+    postcodes = {suburb_postcode(suburb) for suburb in completed} - \
+        {suburb_postcode(suburb) for suburb in suburbs if suburb not in completed}
+    if len(completed) < len(suburbs):
+        print(f"{len(suburbs) - len(completed)} suburbs weren't fully crawled, "
+              f"their listings are kept as they were.")
+    new, changed, unchanged, vanished = index.diff(fingerprints, postcodes)
+    print(f"{len(new)} new, {len(changed)} changed, {len(unchanged)} unchanged and {len(vanished)} delisted listings.")
+
+    records = scrape_property_data(new + changed, frontier=frontier, cache=cache, stats=stats, limiter=limiter)
+    changes = index.update(records, fingerprints, unchanged, vanished, seen_at)
+
+    headers = CSV_HEADERS + ['FirstSeen', 'LastSeen']
+    with open(DELTA_FILE, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['Change'] + headers)
+        writer.writeheader()
+        for change, record in changes:
+            writer.writerow({'Change': change, **record, **index.seen_dates(record['URL'])})
+    print(f"Wrote {len(changes)} changes to {DELTA_FILE}.")
+
+    with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(index.snapshot())
+    print(f"Wrote the snapshot of active listings to {OUTPUT_FILE}.")
+
+
+class CSVSink:
+    """
+    Streams scraped property metadata into a CSV file as it arrives instead of saving it all
+    at the end of a run.
+
+    Rows are buffered and handed to the OS every `flush_every` rows, so other processes can
+    read the partial file, and `checkpoint` forces everything written so far onto disk.
+    With `append=True` an existing file is continued and the URLs already in it are kept in
+    `written_urls` so a resumed run can skip them.
+    """
+    def __init__(self, output_file, append=True, flush_every=50, checkpoint_every=500):
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        self.output_file = output_file
+        self.flush_every = flush_every
+        self.checkpoint_every = checkpoint_every
+        self.written_urls = set()
+        self.buffer = []
+
+        if append and os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+            with open(output_file, newline='', encoding='utf-8') as f:
+                self.written_urls = {row['URL'] for row in csv.DictReader(f)}
+            self.file = open(output_file, 'a', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_HEADERS)
+        else:
+            self.file = open(output_file, 'w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_HEADERS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        self.buffer.append(record)
+        self.written_urls.add(record['URL'])
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.writer.writerows(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def checkpoint(self):
+        self.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.checkpoint()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_parquet(csv_file=OUTPUT_FILE, dataset_dir=PARQUET_DIR, crawl_date=None):
+    """
+    Converts a scraped CSV file into a Parquet dataset partitioned by crawl date and postcode,
+    e.g. `<dataset_dir>/CrawlDate=2024-09-01/Postcode=3011/`.
+
+    Text fields stay as scraped, coordinates are stored as floats and the suburb and property
+    type columns are dictionary encoded, so downstream notebooks can read only the columns and
+    postcodes they need with `landing.read_scrape`. Exporting the same crawl date again
+    replaces it.
+
+    Parameters:
+    csv_file: the CSV file written by the crawl.
+    dataset_dir: the root directory of the Parquet dataset.
+    crawl_date: ISO date of the crawl, defaults to today.
+    """
+    crawl_date = crawl_date or datetime.now(timezone.utc).date().isoformat()
+    df = pd.read_csv(csv_file, dtype=str)
+
+    # suburb and postcode come from the address, falling back to the suburb the listing was found in
+    location = df['Address'].str.extract(ADDRESS_LOCATION_PATTERN)
+    searched = df['URL'].str.extract(r'-vic-(\d{4})', flags=re.IGNORECASE)[0]
+    df['Suburb'] = location['suburb'].str.title().astype('category')
+    df['Postcode'] = location['postcode'].fillna(searched).astype('Int16')
+    df['PropertyType'] = df['PropertyType'].astype('category')
+    for column in ('Latitude', 'Longitude'):
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    for column in ('FirstSeen', 'LastSeen'):
+        if column in df:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+    df['CrawlDate'] = crawl_date
+
+    partition = os.path.join(dataset_dir, f"CrawlDate={crawl_date}")
+    if os.path.exists(partition):
+        shutil.rmtree(partition)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_to_dataset(table, dataset_dir, partition_cols=['CrawlDate', 'Postcode'], compression='zstd',
+                        existing_data_behavior='overwrite_or_ignore')
+    print(f"Wrote {len(df)} listings in {df['Postcode'].nunique()} postcodes to {partition}.")
+
+
+def crawl(suburbs, output_file=OUTPUT_FILE, frontier_file=FRONTIER_FILE, stats_file=STATS_FILE,
+          offline=False, incremental=False, rate_share=1, parquet_dir=PARQUET_DIR):
+    """
+    Runs a complete crawl of the given suburbs, resuming from `frontier_file` if a previous run
+    was interrupted.
+
+    Parameters:
+    suburbs: list of suburbs to search for property listings.
+    output_file: the CSV file the scraped listings are streamed into.
+    frontier_file: the SQLite file that records the progress of the crawl.
+    stats_file: path prefix of the telemetry files.
+    offline: replay pages from the HTTP cache without touching the network.
+    incremental: only scrape listings that changed since the last run, see `incremental_crawl`.
+    rate_share: number of crawls running side by side from this machine, each one gets that
+    share of the request rate so together they stay as polite as one crawl.
+    parquet_dir: where to export the listings as a partitioned Parquet dataset, or None to skip it.
+    """
+    # progress is kept in frontier_file, delete it to start a crawl from scratch
+    resuming = os.path.exists(frontier_file)
+    frontier = CrawlFrontier(frontier_file)
+    cache = HTTPCache(CACHE_DIR, offline=offline)
+    stats = CrawlStats(stats_file)
+    # shared so the listing crawl starts at the rate the index crawl settled on
+    limiter = AdaptiveRateLimiter(REQUESTS_PER_SECOND / rate_share,
+                                  min_rate=MIN_REQUESTS_PER_SECOND / rate_share,
+                                  max_rate=MAX_REQUESTS_PER_SECOND / rate_share)
+    print(f"Crawl frontier at {frontier_file}: {frontier.summary()}")
+    if incremental:
+        index = ListingIndex(LISTING_INDEX_FILE)
+        incremental_crawl(index, suburbs=suburbs, frontier=frontier, cache=cache, stats=stats, limiter=limiter)
+        index.close()
+    else:
+        links = fetch_property_links(N_PAGES, suburbs, frontier=frontier, cache=cache, stats=stats, limiter=limiter)
+        links = get_unique_urls(links)
+        with CSVSink(output_file, append=resuming) as sink:
+            written = scrape_property_data(links, frontier=frontier, sink=sink, cache=cache, stats=stats,
+                                           limiter=limiter)
+        print(f"Wrote {written} listings to {output_file}.")
+    if parquet_dir:
+        save_parquet(OUTPUT_FILE if incremental else output_file, parquet_dir)
+    print(cache.summary())
+    stats.close()
+    print(f"Crawl telemetry written to {stats_file}.json and {stats_file}.prom")
+
+    # the run is complete, so the next one starts from scratch
+    frontier.close()
+    os.remove(frontier_file)
+
+
+def suburb_postcode(suburb):
+    return int(suburb.rsplit('-', 1)[1])
+
+
+def shard_suburbs(suburbs, num_shards):
+    """
+    Splits suburbs into contiguous postcode ranges of roughly equal size.
+
+    The split only depends on the suburb list, so every machine computes the same shards.
+    A postcode is never split between two shards.
+
+    Parameters:
+    suburbs: list of suburb slugs ending in their postcode, e.g. 'footscray-vic-3011'.
+    num_shards: number of partitions.
+
+    Returns:
+    list: `num_shards` lists of suburbs, in postcode order. Some are empty when there are
+    fewer postcodes than shards.
+    """
+    postcodes = defaultdict(list)
+    for suburb in sorted(suburbs):
+        postcodes[suburb_postcode(suburb)].append(suburb)
+    shards = [[] for _ in range(num_shards)]
+    position = 0
+    for postcode in sorted(postcodes):
+        # a postcode goes to the shard its first suburb falls in
+        shards[position * num_shards // len(suburbs)].extend(postcodes[postcode])
+        position += len(postcodes[postcode])
+    return shards
+
+
+def shard_path(path, shard, num_shards):
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard-{shard}-of-{num_shards}{extension}"
+
+
+def crawl_shard(shard, num_shards, offline=False, rate_share=1):
+    """
+    Crawls one shard of SUBURBS into its own output, frontier and telemetry files.
+
+    Parameters:
+    shard: index of the shard, from 0 to num_shards - 1.
+    num_shards: number of partitions SUBURBS is split into.
+    offline: replay pages from the HTTP cache without touching the network.
+    rate_share: number of shards crawling side by side from this machine.
+
+    Returns:
+    str: the path of the shard's output file.
+    """
+    suburbs = shard_suburbs(SUBURBS, num_shards)[shard]
+    output_file = shard_path(OUTPUT_FILE, shard, num_shards)
+    if not suburbs:
+        # more shards than postcodes, an empty output keeps the merge simple
+        print(f"Shard {shard} of {num_shards}: no suburbs, skipping.")
+        with CSVSink(output_file, append=False):
+            pass
+        return output_file
+    print(f"Shard {shard} of {num_shards}: {len(suburbs)} suburbs, "
+          f"postcodes {suburb_postcode(suburbs[0])}-{suburb_postcode(suburbs[-1])}")
+    crawl(suburbs, output_file, shard_path(FRONTIER_FILE, shard, num_shards),
+          shard_path(STATS_FILE, shard, num_shards), offline=offline, rate_share=rate_share, parquet_dir=None)
+    return output_file
+
+
+def merge_shards(shard_files, output_file):
+    """
+    Merges the outputs of a sharded crawl, keeping the first row of every listing URL.
+    A listing can show up in more than one shard because search results near a suburb's
+    border include listings from its neighbours.
+
+    Parameters:
+    shard_files: the CSV files written by each shard.
+    output_file: the path of the merged CSV file.
+    """
+    seen = set()
+    rows, duplicates = 0, 0
+    with open(output_file, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=CSV_HEADERS)
+        writer.writeheader()
+        for shard_file in shard_files:
+            with open(shard_file, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    if row['URL'] in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(row['URL'])
+                    writer.writerow(row)
+                    rows += 1
+    print(f"Merged {len(shard_files)} shards into {output_file}: {rows} listings, {duplicates} duplicates dropped.")
+
+
 # main execution
 if __name__ == "__main__":
-    links = fetch_property_links(N_PAGES, SUBURBS)
-    links = get_unique_urls(links)
-    metadata = scrape_property_data(links)
-    save_data(metadata, OUTPUT_FILE)
-
+    arg_parser = argparse.ArgumentParser(description="Scrape rental listings from domain.com.au")
+    arg_parser.add_argument('--offline', action='store_true',
+                            help=f"replay pages from {CACHE_DIR} without touching the network")
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help=f"only scrape listings that changed since the last run, tracked in {LISTING_INDEX_FILE}")
+    arg_parser.add_argument('--num-shards', type=int, default=1,
+                            help="split SUBURBS into this many postcode ranges, each with its own output file")
+    arg_parser.add_argument('--shard', type=int, default=None,
+                            help="only crawl this shard, e.g. to spread the shards over several machines")
+    arg_parser.add_argument('--processes', type=int, default=1,
+                            help="crawl the shards in this many local worker processes")
+    arg_parser.add_argument('--merge', action='store_true',
+                            help=f"merge the shard outputs into {OUTPUT_FILE} without crawling")
+    args = arg_parser.parse_args()
 
+    if args.num_shards == 1:
+        crawl(SUBURBS, offline=args.offline, incremental=args.incremental)
+    elif args.incremental:
+        arg_parser.error("--incremental keeps one listing index and can't be combined with --num-shards")
+    else:
+        shard_files = [shard_path(OUTPUT_FILE, shard, args.num_shards) for shard in range(args.num_shards)]
+        if args.shard is not None:
+            crawl_shard(args.shard, args.num_shards, args.offline)
+        elif not args.merge:
+            with multiprocessing.Pool(args.processes) as pool:
+                pool.starmap(crawl_shard, [(shard, args.num_shards, args.offline, args.processes)
+                                           for shard in range(args.num_shards)])
+        if args.shard is None:
+            merge_shards(shard_files, OUTPUT_FILE)
+            save_parquet(OUTPUT_FILE)
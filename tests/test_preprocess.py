@@ -0,0 +1,22 @@
+import pandas as pd
+from scripts.preprocess import clean_rental_listings, extract_suburb_postcode, extract_suburb_postcodes
+
+
+def test_addresses_in_other_states_are_not_taken_for_victorian_suburbs():
+    addresses = ["3/12 Smith St, Richmond VIC 3121", "5 Bells Line of Road, Richmond NSW 2753",
+                 "12 Smith St Richmond"]
+    expected = [('Richmond', '3121'), ('Unknown', 'Unknown'), ('Richmond', '3121')]
+
+    assert [extract_suburb_postcode(address) for address in addresses] == expected
+    vectorized = extract_suburb_postcodes(pd.Series(addresses))
+    assert list(zip(vectorized['Suburb'], vectorized['Postcode'])) == expected
+
+
+def test_only_missing_parking_counts_as_no_cars():
+    listings = pd.DataFrame({'Cost': ['$500 per week'] * 3, 'Bedrooms': ['2 Beds'] * 3, 'Bathrooms': ['1 Bath'] * 3,
+                             'Parking': ['1 Parking', None, '− Parking'],
+                             'Address': ['3/12 Smith St, Richmond VIC 3121'] * 3, 'PropertyType': ['House'] * 3})
+
+    cleaned, unknown, incomplete = clean_rental_listings(listings)
+
+    assert cleaned['Cars'].tolist() == [1, 0, pd.NA]
@@ -0,0 +1,50 @@
+import asyncio
+from aiohttp import web
+from scripts.benchmark_crawl import synthetic_pages
+from scripts.scrape import BASE_URL, AdaptiveRateLimiter, fetch_property_links_async
+
+
+async def crawl_with_failing_page(pages, failing, suburbs):
+    """Serves `pages` with `failing` always answered with a 500 and crawls the index of `suburbs`."""
+    requests = []
+    base_url = None
+
+    async def handle(request):
+        requests.append(request.path_qs)
+        if request.path_qs == failing:
+            return web.Response(status=500)
+        html = pages.get(request.path_qs)
+        if html is None:
+            return web.Response(status=404)
+        # links to domain.com.au point back at the server, as in benchmark_crawl
+        return web.Response(text=html.replace(BASE_URL, base_url), content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    base_url = "http://127.0.0.1:{}".format(site._server.sockets[0].getsockname()[1])
+    try:
+        links = await fetch_property_links_async(range(1, 25), suburbs, workers=4, rate=1000,
+                                                 limiter=AdaptiveRateLimiter(1000, max_rate=1000),
+                                                 base_url=base_url)
+    finally:
+        await runner.cleanup()
+    return links, requests
+
+
+def test_failed_first_page_still_crawls_the_rest_of_the_suburb():
+    pages = synthetic_pages(n_suburbs=1, max_listings=100, seed=5)
+    index_pages = sorted(path for path in pages if path.startswith('/rent/'))
+    suburb = index_pages[0].split('/')[2]
+    assert len(index_pages) >= 4
+    failing = f"/rent/{suburb}/?page=1"
+
+    links, requests = asyncio.run(crawl_with_failing_page(pages, failing, [suburb]))
+
+    # every page after the failing one is requested, with the count read from page 2
+    assert set(index_pages) - {failing} <= set(requests)
+    n_listings = sum(not path.startswith('/rent/') for path in pages)
+    assert len(links) == n_listings - 20